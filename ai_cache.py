@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+AI 结果缓存
+总结按规范化 URL 缓存，标签按总结内容哈希缓存，存放在 vault 中的 SQLite 文件里（不随 vault 提交）。
+支持 TTL 过期和按条数的 LRU 淘汰。
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# 与重复收藏检测使用同一个规范化函数，判为同一 URL 的书签共用一份总结
+from dedup_index import canonical_url
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class AICache:
+    """
+    总结 / 标签缓存
+    """
+    def __init__(self, db_path: Path, ttl_days: int = 90, max_entries: int = 5000):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY, title TEXT, content TEXT,
+                created_at REAL, accessed_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS tags (
+                key TEXT PRIMARY KEY, tags TEXT,
+                created_at REAL, accessed_at REAL
+            );
+        """)
+        self.hits = {'summaries': 0, 'tags': 0}
+        self.misses = {'summaries': 0, 'tags': 0}
+
+    def _get(self, table: str, key: str):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT * FROM {table} WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses[table] += 1
+                return None
+            self.conn.execute(f"UPDATE {table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits[table] += 1
+            return row
+
+    def _put(self, table: str, key: str, values: tuple):
+        now = time.time()
+        placeholders = ', '.join('?' * len(values))
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {table} VALUES (?, {placeholders}, ?, ?)", (key, *values, now, now)
+            )
+            self.conn.commit()
+
+    def get_summary(self, url: str) -> tuple:
+        """
+        返回缓存的 (title, content)，未命中返回 None
+        """
+        row = self._get('summaries', canonical_url(url))
+        return (row[1], row[2]) if row else None
+
+    def put_summary(self, url: str, title: str, content: str):
+        self._put('summaries', canonical_url(url), (title, content))
+
+    def get_tags(self, content: str) -> list:
+        """
+        返回缓存的标签，未命中返回 None
+        """
+        row = self._get('tags', text_hash(content))
+        return json.loads(row[1]) if row else None
+
+    def put_tags(self, content: str, tags: list):
+        self._put('tags', text_hash(content), (json.dumps(tags, ensure_ascii=False),))
+
+    def evict(self):
+        """
+        删除过期条目，并按最近访问时间淘汰超出上限的条目
+        """
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            for table in ('summaries', 'tags'):
+                self.conn.execute(f"DELETE FROM {table} WHERE created_at < ?", (cutoff,))
+                self.conn.execute(f"""
+                    DELETE FROM {table} WHERE key IN (
+                        SELECT key FROM {table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+            self.conn.commit()
+
+    def close(self):
+        self.evict()
+        with self.lock:
+            self.conn.close()
+
+    def print_stats(self):
+        print(f"🗃️ AI 缓存: 总结命中 {self.hits['summaries']} / 未命中 {self.misses['summaries']}, "
+              f"标签命中 {self.hits['tags']} / 未命中 {self.misses['tags']}")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+AI 步骤调度
+在给定的时间预算内（如定时任务的间隔）派发笔记（顺序由任务队列决定：收藏优先、最新优先）；
+按观察到的延迟和 429 / 5xx 以 AIMD 方式调整并发；每个后端连续失败时熔断。
+停止派发后剩余的笔记保持原样，留给下次运行。
+"""
+
+import threading
+import time
+
+from metrics import metrics
+
+
+class CircuitOpenError(Exception):
+    """
+    后端已熔断，请求没有发出
+    """
+
+
+class CircuitBreaker:
+    """
+    连续失败 failure_threshold 次后熔断，cooldown 秒后放行一次试探请求：
+    试探成功则恢复，失败则重新计时（常驻模式下客户端跨轮次复用，熔断状态随之保留）
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """
+        熔断中（冷却期内，或冷却后的试探请求尚未返回）
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            return self.probing or time.monotonic() - self.opened_at < self.cooldown
+
+    def allow(self) -> bool:
+        """
+        是否允许发出请求；冷却结束后只放行一个试探请求
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.probing = True
+            return True
+
+    def record(self, success: bool):
+        with self.lock:
+            if success:
+                if self.opened_at is not None:
+                    print(f"🔌 {self.name} 已恢复")
+                self.failures = 0
+                self.opened_at = None
+                self.probing = False
+                return
+            self.failures += 1
+            if not self.probing and (self.opened_at is not None or self.failures < self.failure_threshold):
+                return
+            self.opened_at = time.monotonic()
+            self.probing = False
+        metrics.inc('circuit_open_total', backend=self.name)
+        print(f"🔌 {self.name} 连续失败 {self.failures} 次，熔断 {self.cooldown:.0f}s")
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 并发上限：请求成功且延迟正常时每次加 1/limit（约每轮加 1），
+    遇到 429 / 5xx / 超时，或延迟超过平均值的 slow_factor 倍时减半
+    """
+    def __init__(self, initial: int, maximum: int, minimum: int = 1, slow_factor: float = 3.0):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.slow_factor = slow_factor
+        self.in_flight = 0
+        # 成功请求延迟的指数移动平均
+        self.avg_latency = 0.0
+        self.samples = 0
+        self.decreased_at = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float = None, congested: bool = False):
+        """
+        归还并发名额；latency 为 None 时（请求没有发出）不调整上限
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+            if latency is None:
+                return
+            slow = self.samples >= 5 and latency > self.avg_latency * self.slow_factor
+            if congested or slow:
+                # 同一批并发请求一起失败时只减半一次
+                now = time.monotonic()
+                if now - self.decreased_at < max(self.avg_latency, 1.0):
+                    return
+                self.decreased_at = now
+                self.limit = max(float(self.minimum), self.limit / 2)
+                metrics.inc('ai_concurrency_decreases_total')
+                print(f"   📉 AI 并发上限降至 {int(self.limit)} ({'限流/出错' if congested else f'延迟 {latency:.1f}s'})")
+                return
+            self.avg_latency = latency if not self.samples else self.avg_latency * 0.8 + latency * 0.2
+            self.samples += 1
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+
+class AIScheduler:
+    """
+    时间预算 + 自适应并发 + 熔断
+    budget 为秒数（0 表示不限）；预计剩余时间不足以完成一篇笔记，或 AI 总结后端熔断时停止派发
+    """
+    def __init__(self, budget: float = 0, concurrency: int = 3, max_concurrency: int = 0,
+                 breaker: CircuitBreaker = None):
+        self.budget = budget
+        self.started_at = time.monotonic()
+        self.concurrency = AdaptiveConcurrency(concurrency, max_concurrency or concurrency)
+        self.breaker = breaker
+        self.deferred = 0
+        self.stop_reason = ''
+        self.lock = threading.Lock()
+
+    def remaining(self) -> float:
+        if not self.budget:
+            return float('inf')
+        return self.budget - (time.monotonic() - self.started_at)
+
+    def should_stop(self) -> bool:
+        if self.stop_reason:
+            return True
+        reason = ''
+        if self.remaining() <= self.concurrency.avg_latency:
+            reason = f'时间预算 {self.budget:.0f}s 用尽'
+        elif self.breaker and self.breaker.is_open:
+            reason = f'{self.breaker.name} 熔断'
+        if not reason:
+            return False
+        with self.lock:
+            if not self.stop_reason:
+                self.stop_reason = reason
+                print(f"⏹️ 停止派发新的 AI 任务: {reason}，剩余笔记留待下次运行")
+        return True
+
+    def defer(self, count: int = 1):
+        """
+        记录未处理、保持原样的笔记数
+        """
+        with self.lock:
+            self.deferred += count
+        metrics.inc('ai_deferred_total', count)
+
+    def feed(self, items):
+        """
+        向流水线派发条目，停止后剩余的条目只计数不派发
+        （流式来源如同步队列仍会读到结束，不会阻塞生产者）
+        """
+        for item in items:
+            if self.should_stop():
+                self.defer()
+                continue
+            yield item
+
+    def print_stats(self):
+        elapsed = time.monotonic() - self.started_at
+        budget = f" / 预算 {self.budget:.0f}s" if self.budget else ""
+        print(f"⏱️ AI 调度: 用时 {elapsed:.1f}s{budget}, 并发上限 {int(self.concurrency.limit)}, "
+              f"平均总结耗时 {self.concurrency.avg_latency:.1f}s, 留待下次 {self.deferred} 篇"
+              + (f" ({self.stop_reason})" if self.stop_reason else ""))
@@ -4,27 +4,96 @@ AI 总结生成脚本
 扫描 Raindrop 生成的 Markdown 文件，对缺失 AI 总结的文件调用接口补充内容。
 """
 
+import argparse
 import os
-import sys
 import json
 import time
+import threading
 import requests
 import re
+import socket
+import sqlite3
 from pathlib import Path
-from datetime import datetime, timedelta
+
+from ai_cache import AICache, text_hash
+from ai_scheduler import AIScheduler, CircuitBreaker, CircuitOpenError
+from api_client import TokenBucket
+from job_queue import JobQueue
+import local_summarizer
+from local_tagger import LocalTagger
+from metrics import metrics, profile
+from note_document import NOTE_WRITE_LOCK, NoteDocument
+from pipeline import Pipeline, Stage
+from search_index import SearchIndex
+from vault_manifest import VaultManifest
+
+class StreamResult:
+    """
+    一次 AI 总结流的结果和吞吐统计
+    complete 为 False 时 title/content 为中断前已收到的部分内容
+    """
+    def __init__(self):
+        self.title = ""
+        self.content = ""
+        self.complete = False
+        self.error = ""
+        # HTTP 状态码（请求没有得到响应时为 0）
+        self.status = 0
+        self.bytes = 0
+        self.events = 0
+        self.elapsed = 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def congested(self) -> bool:
+        """
+        后端过载的信号：429 / 5xx，或连接失败 / 超时 / 流中断
+        """
+        return self.status == 429 or self.status >= 500 or (bool(self.error) and self.status in (0, 200))
+
 
 class AISummarizer:
     """
     得到/罗辑实验室 AI 总结器
     """
-    def __init__(self, api_token: str):
+    def __init__(self, api_token: str, connect_timeout: float = 10, idle_timeout: float = 60,
+                 total_timeout: float = 300):
         self.api_token = api_token
-        self.url = "https://get-notes.luojilab.com/voicenotes/web/notes/stream"
+        self.url = os.getenv('DEDAO_API_URL', "https://get-notes.luojilab.com/voicenotes/web/notes/stream")
+        self.connect_timeout = connect_timeout
+        # 两个数据包之间的最长间隔
+        self.idle_timeout = idle_timeout
+        # 整个流的最长耗时
+        self.total_timeout = total_timeout
+        self.breaker = CircuitBreaker('dedao')
         
     def summarize(self, target_url: str) -> tuple[str, str]:
         """
         调用 AI 接口生成总结
-        返回: (title, content)
+        返回: (title, content)，未完整接收或已熔断时返回空
+        """
+        try:
+            result = self.summarize_stream(target_url)
+        except CircuitOpenError:
+            return "", ""
+        if not result.complete:
+            return "", ""
+        return result.title, result.content
+
+    def summarize_stream(self, target_url: str, partial_path: Path = None, timeout: float = None) -> StreamResult:
+        """
+        流式调用 AI 接口
+        正文分片边收边追加（指定 partial_path 时直接写入磁盘，内存占用不随总结长度增长），
+        中途出错时保留已收到的部分，供调用方保存或重试。
+        timeout 为本次调用的总时长上限（如剩余的时间预算），与 total_timeout 取较小值，到时直接断开流。
+        已熔断时抛出 CircuitOpenError，不发出请求。
         """
         headers = {
             "Authorization": f"Bearer {self.api_token}",
@@ -48,88 +117,174 @@ class AISummarizer:
             "prompt_template_id": ""
         }
         
-        full_title = ""
-        full_content = ""
+        if not self.breaker.allow():
+            raise CircuitOpenError("AI 总结已熔断")
+        result = StreamResult()
+        title_parts = []
+        content_parts = []
+        partial_file = None
+        start = time.monotonic()
+        total_timeout = self.total_timeout if timeout is None else max(0.0, min(self.total_timeout, timeout))
+        # 到达总时长时从另一个线程关闭响应，不必等下一个数据包或空闲超时
+        deadline = None
         
         try:
+            if partial_path:
+                partial_path.parent.mkdir(parents=True, exist_ok=True)
+                partial_file = open(partial_path, 'w', encoding='utf-8')
+            
             print(f"   🤖 正在请求 AI 总结: {target_url}")
-            with requests.post(self.url, headers=headers, json=payload, stream=True) as response:
+            with requests.post(self.url, headers=headers, json=payload, stream=True,
+                               timeout=(min(self.connect_timeout, total_timeout),
+                                        min(self.idle_timeout, total_timeout))) as response:
+                deadline = threading.Timer(max(0.0, total_timeout - (time.monotonic() - start)), abort_response,
+                                           args=(response,))
+                deadline.daemon = True
+                deadline.start()
+                metrics.inc('api_requests_total', api='dedao', status=response.status_code)
+                result.status = response.status_code
                 if response.status_code != 200:
-                    print(f"   ⚠️ AI 请求失败: {response.status_code} - {response.text}")
-                    return "", ""
+                    result.error = f"{response.status_code} - {response.text}"
+                    if response.status_code == 429:
+                        metrics.inc('api_rate_limited_total', api='dedao')
+                    print(f"   ⚠️ AI 请求失败: {result.error}")
+                    return result
                 
                 for line in response.iter_lines():
+                    if time.monotonic() - start > total_timeout:
+                        raise TimeoutError(f"超过总时长限制 {total_timeout:.0f}s")
                     if not line:
                         continue
-                        
-                    decoded_line = line.decode('utf-8')
-                    if decoded_line.startswith("data: "):
-                        json_str = decoded_line[6:] # Remove 'data: ' prefix
-                        try:
-                            # 某些心跳包可能是空或者只包含 id
-                            if not json_str.strip() or json_str.strip() == "[DONE]":
-                                continue
-                                
-                            data_obj = json.loads(json_str)
-                            # Parse inner data
-                            if "data" in data_obj and isinstance(data_obj["data"], dict) and "msg" in data_obj["data"]:
-                                inner_msg_str = data_obj["data"]["msg"]
-                                try:
-                                    inner_msg = json.loads(inner_msg_str)
-                                    
-                                    # Accumulate title
-                                    if "summary_title" in inner_msg:
-                                        full_title += inner_msg["summary_title"]
-                                        
-                                    # Accumulate content
-                                    if "content" in inner_msg:
-                                        full_content += inner_msg["content"]
-                                except (json.JSONDecodeError, TypeError):
-                                    pass # Ignore non-json inner msg
-                        except json.JSONDecodeError:
-                            pass
-                            
-            return full_title, full_content
+                    result.bytes += len(line)
+                    
+                    # 某些心跳包可能是空或者只包含 id
+                    if not line.startswith(b"data: "):
+                        continue
+                    json_bytes = line[6:].strip() # Remove 'data: ' prefix
+                    if not json_bytes or json_bytes == b"[DONE]":
+                        continue
+                    result.events += 1
+                    
+                    title_part, content_part = parse_stream_event(json_bytes)
+                    if title_part:
+                        title_parts.append(title_part)
+                    if content_part:
+                        if partial_file:
+                            partial_file.write(content_part)
+                        else:
+                            content_parts.append(content_part)
+            
+            result.complete = True
             
         except Exception as e:
+            if deadline and deadline.finished.is_set():
+                e = TimeoutError(f"超过总时长限制 {total_timeout:.0f}s")
+            result.error = str(e)
+            metrics.inc('api_errors_total', api='dedao', error=type(e).__name__)
             print(f"   ⚠️ AI 处理异常: {e}")
-            return "", ""
+        
+        finally:
+            if deadline:
+                deadline.cancel()
+            result.elapsed = time.monotonic() - start
+            self.breaker.record(result.complete)
+            metrics.observe('api_request_seconds', result.elapsed, api='dedao')
+            metrics.inc('api_response_bytes_total', result.bytes, api='dedao')
+            metrics.inc('sse_events_total', result.events, api='dedao')
+            result.title = ''.join(title_parts)
+            if partial_file:
+                partial_file.close()
+                result.content = partial_path.read_text(encoding='utf-8')
+            else:
+                result.content = ''.join(content_parts)
+            print(f"   📶 AI 流统计: {result.bytes} 字节, {result.events} 事件, {result.elapsed:.1f}s "
+                  f"({result.bytes_per_second:.0f} B/s, {result.events_per_second:.1f} 事件/s)")
+        
+        return result
+
+
+def abort_response(response: requests.Response):
+    """
+    中断仍在读取的流式响应：先关闭底层 socket（response.close 不会打断另一个线程中阻塞的读取），再关闭响应
+    """
+    # 读取响应体时 socket 已交给 http.client 的响应对象（urllib3 连接上的 sock 为 None）
+    fp = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+    sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+    if sock:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+def parse_stream_event(json_bytes: bytes) -> tuple[str, str]:
+    """
+    解析一个 SSE data 事件，返回 (summary_title 片段, content 片段)
+    内层 msg 也是 JSON 字符串，只有包含相关字段时才做第二次解析
+    """
+    try:
+        data_obj = json.loads(json_bytes)
+    except json.JSONDecodeError:
+        return "", ""
+    
+    data = data_obj.get("data") if isinstance(data_obj, dict) else None
+    if not isinstance(data, dict) or "msg" not in data:
+        return "", ""
+    
+    inner_msg_str = data["msg"]
+    if not isinstance(inner_msg_str, str) or ('"content"' not in inner_msg_str and '"summary_title"' not in inner_msg_str):
+        return "", ""
+    
+    try:
+        inner_msg = json.loads(inner_msg_str)
+    except json.JSONDecodeError:
+        return "", "" # Ignore non-json inner msg
+    if not isinstance(inner_msg, dict):
+        return "", ""
+    
+    title_part = inner_msg.get("summary_title")
+    content_part = inner_msg.get("content")
+    return (title_part if isinstance(title_part, str) else "",
+            content_part if isinstance(content_part, str) else "")
+
+
+TAG_RULES = """- Aim for a variety of tags, including broad categories, specific keywords, and potential sub-genres.
+- The tags language must be in chinese.
+- If it's a famous website you may also include a tag for the website. If the tag is not generic enough, don't include it.
+- The content can include text for cookie consent and privacy policy, ignore those while tagging.
+- Aim for 3-5 tags.每个 tag 不得包含任何空格或特殊字符
+- If there are no good tags, leave the array empty."""
 
 
 class AITagger:
     """
     智谱 AI 标签生成器
     """
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, batch_token_budget: int = 6000):
         self.api_key = api_key
-        self.url = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
+        self.url = os.getenv('ZHIPU_API_URL', "https://open.bigmodel.cn/api/paas/v4/chat/completions")
         self.model = "glm-4.7-flash"
+        # 批量请求中所有内容的大致 token 上限（中文约 1 字 1 token，按字符数估算）
+        self.batch_token_budget = batch_token_budget
+        self.request_count = 0
+        # 实际拿到远程标签的笔记数（标签阶段有多个线程）
+        self.tagged_count = 0
+        self.lock = threading.Lock()
+        self.breaker = CircuitBreaker('glm')
 
-    def generate_tags(self, content: str) -> list[str]:
+    def chat(self, prompt: str, timeout: int = 30) -> str:
         """
-        根据内容生成标签
+        发送一次对话请求，返回模型输出文本（失败返回空串）
+        已熔断时直接抛出 CircuitOpenError
         """
+        if not self.breaker.allow():
+            raise CircuitOpenError("智谱 AI 已熔断")
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
         
-        prompt = """You are a bot in a read-it-later app and your responsibility is to help with automatic tagging.
-Please analyze the text provided below and suggest relevant tags that describe its key themes, topics, and main ideas. The rules are:
-- Aim for a variety of tags, including broad categories, specific keywords, and potential sub-genres.
-- The tags language must be in chinese.
-- If it's a famous website you may also include a tag for the website. If the tag is not generic enough, don't include it.
-- The content can include text for cookie consent and privacy policy, ignore those while tagging.
-- Aim for 3-5 tags.每个 tag 不得包含任何空格或特殊字符
-- If there are no good tags, leave the array empty.
-
-CONTENT START HERE
-{content}
-CONTENT END HERE
-
-You must respond in JSON with the key "tags" and the value is an array of string tags.
-"""
-        
         payload = {
             "model": self.model,
             "messages": [
@@ -139,33 +294,58 @@ You must respond in JSON with the key "tags" and the value is an array of string
                 },
                 {
                     "role": "user",
-                    "content": prompt.replace("{content}", content)
+                    "content": prompt
                 }
             ],
             "stream": False,
             "temperature": 0.1
         }
 
+        self.request_count += 1
         try:
-            print(f"   🏷️ 正在请求 AI 标签...")
-            response = requests.post(self.url, headers=headers, json=payload, timeout=30)
-            if response.status_code != 200:
-                print(f"   ⚠️ 标签请求失败: {response.status_code} - {response.text}")
-                return []
-                
-            data = response.json()
-            if "choices" in data and len(data["choices"]) > 0:
-                content_str = data["choices"][0]["message"]["content"]
-                # 尝试提取 JSON
-                try:
-                    # 某些情况下 AI 可能返回 ```json ... ``` 包裹
-                    json_match = re.search(r'\{.*\}', content_str, re.DOTALL)
-                    if json_match:
-                        json_content = json_match.group(0)
-                        tags_obj = json.loads(json_content)
-                        return tags_obj.get("tags", [])
-                except Exception as e:
-                    print(f"   ⚠️ 标签解析失败: {e}")
+            with metrics.timer('api_request_seconds', api='glm'):
+                response = requests.post(self.url, headers=headers, json=payload, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            metrics.inc('api_errors_total', api='glm', error=type(e).__name__)
+            self.breaker.record(False)
+            raise
+        metrics.inc('api_requests_total', api='glm', status=response.status_code)
+        metrics.inc('api_response_bytes_total', len(response.content), api='glm')
+        self.breaker.record(response.status_code == 200)
+        if response.status_code != 200:
+            print(f"   ⚠️ 标签请求失败: {response.status_code} - {response.text}")
+            return ""
+            
+        data = response.json()
+        if "choices" in data and len(data["choices"]) > 0:
+            return data["choices"][0]["message"]["content"]
+        return ""
+
+    def generate_tags(self, content: str) -> list[str]:
+        """
+        根据内容生成标签
+        """
+        prompt = f"""You are a bot in a read-it-later app and your responsibility is to help with automatic tagging.
+Please analyze the text provided below and suggest relevant tags that describe its key themes, topics, and main ideas. The rules are:
+{TAG_RULES}
+
+CONTENT START HERE
+{{content}}
+CONTENT END HERE
+
+You must respond in JSON with the key "tags" and the value is an array of string tags.
+"""
+
+        try:
+            print("   🏷️ 正在请求 AI 标签...")
+            content_str = self.chat(prompt.replace("{content}", content))
+            # 尝试提取 JSON
+            try:
+                tags_obj = extract_json(content_str)
+                if tags_obj:
+                    return tags_obj.get("tags", [])
+            except Exception as e:
+                print(f"   ⚠️ 标签解析失败: {e}")
                     
             return []
             
@@ -173,49 +353,102 @@ You must respond in JSON with the key "tags" and the value is an array of string
             print(f"   ⚠️ 标签处理异常: {e}")
             return []
 
+    def generate_tags_batch(self, items: list) -> dict:
+        """
+        批量生成标签
+        items: [(id, content)]，按 token 预算打包成尽量少的请求
+        返回 {id: tags}；批量结果中缺失或解析失败的条目回退为单条请求
+        """
+        results = {}
+        for batch in self.pack_batches(items):
+            if len(batch) == 1:
+                item_id, content = batch[0]
+                results[item_id] = self.generate_tags(content)
+                continue
+            
+            batch_results = self.request_batch(batch)
+            for item_id, content in batch:
+                if item_id in batch_results:
+                    results[item_id] = batch_results[item_id]
+                else:
+                    print(f"   ↩️ 批量标签缺少条目 {item_id}，改为单条请求")
+                    results[item_id] = self.generate_tags(content)
+        with self.lock:
+            self.tagged_count += sum(1 for tags in results.values() if tags)
+        return results
 
-def extract_url_from_file(file_path: Path) -> str:
-    """
-    从 Markdown 文件中提取 URL
-    """
-    try:
-        content = file_path.read_text(encoding='utf-8')
+    def pack_batches(self, items: list) -> list:
+        """
+        按 batch_token_budget 把条目打包
+        """
+        batches = []
+        current = []
+        current_size = 0
+        for item_id, content in items:
+            size = len(content)
+            if current and current_size + size > self.batch_token_budget:
+                batches.append(current)
+                current, current_size = [], 0
+            current.append((item_id, content))
+            current_size += size
+        if current:
+            batches.append(current)
+        return batches
+
+    def request_batch(self, batch: list) -> dict:
+        """
+        发送一次多条目标签请求，返回成功解析的 {id: tags}
+        """
+        sections = "\n\n".join(
+            f"ITEM {item_id} START\n{content}\nITEM {item_id} END" for item_id, content in batch
+        )
+        prompt = f"""You are a bot in a read-it-later app and your responsibility is to help with automatic tagging.
+Below are several items, each wrapped in "ITEM <id> START" / "ITEM <id> END". For every item, analyze its text and suggest relevant tags that describe its key themes, topics, and main ideas. The rules are:
+{TAG_RULES}
+
+{sections}
+
+You must respond in JSON of the form {{"results": [{{"id": "<id>", "tags": ["tag1", "tag2"]}}]}} with exactly one entry per item.
+"""
+
+        try:
+            print(f"   🏷️ 正在批量请求 AI 标签 ({len(batch)} 条)...")
+            results_obj = extract_json(self.chat(prompt, timeout=60))
+        except Exception as e:
+            print(f"   ⚠️ 批量标签处理异常: {e}")
+            return {}
         
-        # 1. 尝试从 FrontMatter 提取 url: https://...
-        match = re.search(r'^url:\s*(.+)$', content, re.MULTILINE)
-        if match:
-            return match.group(1).strip()
-            
-        # 2. 尝试从正文提取 🔗 [url](https://...)
-        match = re.search(r'🔗 \[(.*?)\]\((http.*?)\)', content)
-        if match:
-            return match.group(2).strip()
-            
-    except Exception as e:
-        print(f"   读取文件失败: {e}")
-    
-    return ""
+        results = {}
+        wanted = {str(item_id): item_id for item_id, _ in batch}
+        for entry in (results_obj or {}).get("results", []):
+            if not isinstance(entry, dict) or not isinstance(entry.get("tags"), list):
+                continue
+            item_id = wanted.get(str(entry.get("id")))
+            if item_id is not None:
+                results[item_id] = [str(tag) for tag in entry["tags"]]
+        return results
 
-def has_ai_summary(file_path: Path) -> bool:
+
+def extract_json(content_str: str) -> dict:
     """
-    检查文件是否已经包含 AI 总结
+    从模型输出中提取 JSON 对象（某些情况下 AI 可能返回 ```json ... ``` 包裹）
     """
-    try:
-        content = file_path.read_text(encoding='utf-8')
-        return "## 🤖 AI 深度总结" in content
-    except:
-        return False
+    json_match = re.search(r'\{.*\}', content_str or "", re.DOTALL)
+    if not json_match:
+        return None
+    return json.loads(json_match.group(0))
+
 
-def process_files(output_dir: str = '30_Resources/Raindrop', days: int = 3):
+def create_ai_clients() -> tuple:
     """
-    扫描并处理文件
+    根据环境变量创建 AI 总结器和标签器，未配置 DEDAO_API_TOKEN 时返回 (None, None)
     """
     dedao_token = os.getenv('DEDAO_API_TOKEN')
     zhipu_key = os.getenv('ZHIPU_API_KEY')
     
     if not dedao_token:
         print("❌ 未找到 DEDAO_API_TOKEN，跳过 AI 总结步骤")
-        return
+        return None, None
 
     ai_summarizer = AISummarizer(dedao_token)
     
@@ -224,193 +457,385 @@ def process_files(output_dir: str = '30_Resources/Raindrop', days: int = 3):
         ai_tagger = AITagger(zhipu_key)
         print("✨ 已启用 AI 自动标签 (Zhipu)")
     
-    directory = Path(output_dir)
-    
-    if not directory.exists():
-        print(f"❌ 目录不存在: {directory}")
-        return
+    return ai_summarizer, ai_tagger
 
-    print(f"🔍 开始扫描目录: {directory}")
-    print(f"   处理最近 {days} 天修改的文件")
 
-    # 计算时间阈值
-    cutoff_time = datetime.now() - timedelta(days=days)
-    
-    count = 0
-    processed = 0
-    
-    for file_path in directory.glob('*.md'):
-        # 过滤修改时间
-        mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
-        if mtime < cutoff_time:
-            continue
-            
-        count += 1
-        
-        # 检查是否已有总结
-        if has_ai_summary(file_path):
-            continue
-            
-        # 提取 URL
-        url = extract_url_from_file(file_path)
-        if not url:
-            print(f"⏩ 跳过 (无URL): {file_path.name}")
-            continue
-            
-        print(f"👉 处理: {file_path.name}")
-        
-def inject_tags_into_frontmatter(content: str, tags: list[str]) -> str:
+def process_files(output_dir: str = '30_Resources/Raindrop', concurrency: int = 3, rate_per_minute: int = 30,
+                  backfill: bool = False, limit: int = 0,
+                  tag_batch_size: int = 8, tag_batch_wait: float = 5.0, stats: dict = None,
+                  budget: float = 0, max_concurrency: int = 0, mode: str = 'remote') -> list:
     """
-    将标签插入到 FrontMatter 中
+    处理 AI 任务队列中到期的笔记，返回写入了总结的笔记路径
+    backfill 模式先把笔记清单中所有缺少总结的笔记登记到队列（包括已放弃的任务）
+    mode 为 local 时不请求任何接口，只用笔记已有的摘要 / 笔记 / 高亮生成本地临时摘要，标签只用缓存和本地建议；
+    任务留在队列中，之后的远程运行会替换临时摘要
+    concurrency 个文件并发处理（按延迟和限流在 1 ~ max_concurrency 间自适应），AI 总结请求按 rate_per_minute 限速
+    标签阶段最多等待 tag_batch_wait 秒，把至多 tag_batch_size 篇笔记合并为一次请求
+    budget 秒后（0 表示不限）不再派发新笔记，队列按收藏优先、最新优先的顺序认领
     """
-    if not tags:
-        return content
-        
-    # Check for FrontMatter
-    fm_match = re.match(r'^---\n(.*?)\n---', content, re.DOTALL)
-    if not fm_match:
-        # No FM, create one
-        fm = "---\n"
-        fm += "tags:\n"
-        for tag in tags:
-            fm += f"  - {tag}\n"
-        fm += "---\n\n"
-        return fm + content
-        
-    fm_content = fm_match.group(1)
-    
-    # Check if tags key exists
-    if re.search(r'^tags:', fm_content, re.MULTILINE):
-        # Insert after "tags:"
-        # We assume standard yaml formatting created by our own script: "tags:\n"
-        new_tags_str = ""
-        for tag in tags:
-            new_tags_str += f"  - {tag}\n"
-            
-        # Replace "tags:\n" with "tags:\n  - tag1\n..."
-        # Use a safe replacement that looks for the line ending
-        new_fm_content = re.sub(r'(^tags:\s*\n)', rf'\1{new_tags_str}', fm_content, flags=re.MULTILINE)
-        
-        # If the regex didn't match (maybe inline tags: []), fallback to appending
-        if new_fm_content == fm_content:
-             # Try to match tags: without newline
-             pass 
+    if mode == 'local':
+        ai_summarizer, ai_tagger = None, None
+        print("📎 本地摘要模式: 不请求远程 AI")
     else:
-        # Add tags key to end of FM
-        new_tags_block = "\ntags:\n"
-        for tag in tags:
-            new_tags_block += f"  - {tag}\n"
-        new_fm_content = fm_content + new_tags_block
+        ai_summarizer, ai_tagger = create_ai_clients()
+        if not ai_summarizer:
+            return []
+    
+    directory = Path(output_dir)
+    if not directory.exists():
+        print(f"❌ 目录不存在: {directory}")
+        return []
 
-    return content.replace(fm_match.group(1), new_fm_content)
+    manifest = VaultManifest(directory, directory / '.sync' / 'manifest.json')
+    job_queue = JobQueue(directory / '.sync' / 'ai_jobs.sqlite')
+    
+    if backfill:
+        # 只依据清单挑选，不扫描、不读取笔记
+        pending = manifest.pending()
+        if mode == 'local':
+            # 已有临时摘要的笔记不再登记
+            pending = [filename for filename in pending if not manifest.entries[filename].get('provisional')]
+        for filename in pending:
+            job_queue.add(filename, manifest.entries.get(filename))
+        job_queue.save()
+        print(f"🗂️ 补全模式: 清单中有 {len(pending)} 个笔记缺少 AI 总结，已登记到任务队列")
+
+    job_queue.print_stats()
+    return run_ai_pipeline(directory, [], ai_summarizer, ai_tagger, manifest,
+                           concurrency=concurrency, rate_per_minute=rate_per_minute,
+                           tag_batch_size=tag_batch_size, tag_batch_wait=tag_batch_wait, stats=stats,
+                           budget=budget, max_concurrency=max_concurrency, job_queue=job_queue, limit=limit)
 
 
-def process_files(output_dir: str = '30_Resources/Raindrop', days: int = 3):
+def run_ai_pipeline(directory: Path, items, ai_summarizer: AISummarizer, ai_tagger, manifest: VaultManifest,
+                    concurrency: int = 3, rate_per_minute: int = 30,
+                    tag_batch_size: int = 8, tag_batch_wait: float = 5.0, stats: dict = None,
+                    budget: float = 0, max_concurrency: int = 0, job_queue: JobQueue = None,
+                    limit: int = 0) -> list:
     """
-    扫描并处理文件
-    优先读取 new_files_list.txt，如果不存在则扫描目录
+    对 items 和 AI 任务队列中到期的笔记运行 AI 流水线，返回写入了总结的笔记路径
+    ai_summarizer 为 None 时为本地摘要模式（只写临时摘要，跳过已有临时摘要的笔记）
+    items 可以是文件路径，也可以是已解析的 (文件路径, NoteDocument)；
+    可以是任意可迭代对象（如同步过程中不断产生新笔记的队列），流水线边接收边处理，
+    items 读完后再分批认领队列中的任务（失败重试、上次剩下的）；每篇笔记的结果记入队列
+    budget 秒后（0 表示不限）不再派发新笔记；limit 为最多处理的笔记数（0 表示不限）
+    传入 stats 字典时写入各阶段统计（供基准测试使用）
     """
-    dedao_token = os.getenv('DEDAO_API_TOKEN')
-    zhipu_key = os.getenv('ZHIPU_API_KEY')
+    job_queue = job_queue or JobQueue(directory / '.sync' / 'ai_jobs.sqlite')
+    local = ai_summarizer is None
+    scheduler = AIScheduler(budget, concurrency, max_concurrency, None if local else ai_summarizer.breaker)
+    max_workers = scheduler.concurrency.maximum
+    print(f"   并发数: {concurrency} (上限 {max_workers}), 限速: {rate_per_minute} 次/分钟"
+          + (f", 时间预算: {scheduler.budget:.0f}s" if scheduler.budget else ""))
     
-    if not dedao_token:
-        print("❌ 未找到 DEDAO_API_TOKEN，跳过 AI 总结步骤")
-        return
-
-    ai_summarizer = AISummarizer(dedao_token)
+    # 用令牌桶控制 AI 请求节奏，取代固定的 sleep
+    limiter = TokenBucket(rate_per_minute / 60, concurrency)
     
-    ai_tagger = None
-    if zhipu_key:
-        ai_tagger = AITagger(zhipu_key)
-        print("✨ 已启用 AI 自动标签 (Zhipu)")
+    # 总结 / 标签缓存：崩溃重跑或同一 URL 重复收藏时不再重复付费
+    cache = AICache(directory / '.sync' / 'ai_cache.sqlite')
+    # 中断的总结流的部分内容
+    partial_dir = directory / '.sync' / 'partial'
     
-    directory = Path(output_dir)
-    if not directory.exists():
-        print(f"❌ 目录不存在: {directory}")
-        return
-
-    # Check for report file
-    workspace = os.getenv('GITHUB_WORKSPACE', '.')
-    report_file = Path(workspace) / 'new_files_list.txt'
-    target_files = []
+    # 本地标签建议：用已有笔记训练，置信度不足时才请求远程 AI 标签
+    local_tagger = LocalTagger(directory / '.sync' / 'local_tagger.json',
+                               confidence=float(os.getenv('LOCAL_TAG_CONFIDENCE', '0.3')))
+    local_tagger.refresh(directory, manifest)
+    # 全文搜索索引（已建立时）随总结写入增量更新
+    search = SearchIndex.open(directory)
+    
+    # URL 提取 -> 流式总结 -> 标签 -> 写回，各阶段通过有界队列衔接，
+    # 第 N 篇的标签请求与第 N+1 篇的总结流可以同时进行
+    if local:
+        summarize = local_summary_stage
+    else:
+        summarize = lambda job: summarize_stage(job, ai_summarizer, limiter, cache, partial_dir, scheduler, job_queue)
+    # 阶段抛出异常的笔记计一次失败并按退避时间重试，而不是由 release_claimed 放回队列后无限重试
+    on_error = lambda item, error: fail_job(job_queue, item, error)
+    pipeline = Pipeline([
+        Stage('extract', lambda item: extract_stage(item, manifest, job_queue, skip_provisional=local), workers=1,
+              maxsize=concurrency * 2, on_error=on_error),
+        Stage('summarize', summarize, workers=max_workers, maxsize=concurrency * 2, on_error=on_error),
+        Stage('tag', lambda jobs: tag_stage(jobs, ai_tagger, cache, local_tagger, scheduler),
+              workers=max(1, concurrency // 2),
+              maxsize=concurrency * 2, batch_size=tag_batch_size, batch_wait=tag_batch_wait, batch=True,
+              on_error=on_error),
+        Stage('write', lambda job: write_stage(job, manifest, local_tagger, job_queue, search), workers=1,
+              maxsize=concurrency * 2, on_error=on_error)
+    ])
     
-    if report_file.exists():
-        print(f"� 发现同步列表: {report_file}")
+    claimed = job_queue.iter_claimed(items, directory, batch_size=concurrency * 2, limit=limit,
+                                     stop=scheduler.should_stop)
+    written = [job['path'] for job in pipeline.run(scheduler.feed(claimed))]
+    processed = len(written)
+    # 认领了但没有处理的笔记（时间预算用尽 / 熔断）放回队列
+    job_queue.release_claimed()
+    cache.close()
+    manifest.save()
+    local_tagger.save()
+    if search:
         try:
-            with open(report_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    filename = line.strip()
-                    if filename:
-                        file_path = directory / filename
-                        if file_path.exists():
-                            target_files.append(file_path)
-        except Exception as e:
-            print(f"⚠️ 读取列表失败: {e}")
+            search.save()
+        except sqlite3.Error as e:
+            print(f"❌ 更新搜索索引失败: {e}")
+        search.close()
+
+    extract_stats = pipeline.stats()['extract']
+    count = extract_stats['processed'] + extract_stats['dropped'] + extract_stats['errors']
+
+    if stats is not None:
+        stats.update(pipeline.stats())
+    pipeline.print_stats()
+    scheduler.print_stats()
+    job_queue.print_stats()
+    job_queue.close()
+    cache.print_stats()
+    remote_tagged = ai_tagger.tagged_count if ai_tagger else 0
+    print(f"🏷️ 标签来源: 本地 {local_tagger.local_count} 篇, 远程 AI {remote_tagged} 篇")
+    if ai_tagger:
+        print(f"🏷️ 标签请求次数: {ai_tagger.request_count}")
+    print(f"\n📊 AI 处理完成: 扫描 {count} 个文件, 处理 {processed} 个")
+    return written
+
+
+def fail_job(job_queue: JobQueue, item, error: Exception):
+    """
+    记录阶段异常：item 为 extract 阶段的输入（文件路径或 (文件路径, NoteDocument)）或之后阶段的任务字典
+    """
+    if isinstance(item, dict):
+        file_path = item['path']
+    elif isinstance(item, tuple):
+        file_path = item[0]
     else:
-        print(f"🔍 同步列表不存在，跳过 AI 处理")
+        file_path = item
+    job_queue.fail(file_path.name, f"处理出错: {error}")
 
 
-    print(f"🎯 待处理文件数: {len(target_files)}")
-    
-    count = 0
-    processed = 0
+def extract_stage(item, manifest: VaultManifest, job_queue: JobQueue, skip_provisional: bool = False) -> dict:
+    """
+    阶段 1：解析笔记（每个文件只读取一次；同步阶段直接传入的文档不再读取），检查是否已有总结并提取 URL
+    skip_provisional 时跳过已有本地临时摘要的笔记（任务保持不变）
+    """
+    if isinstance(item, tuple):
+        file_path, doc = item
+    else:
+        file_path = item
+        if not file_path.exists():
+            # 笔记已被删除或改名，任务不再重试
+            job_queue.fail(file_path.name, "笔记不存在", retry=False)
+            return None
+        try:
+            doc = NoteDocument.from_file(file_path)
+        except Exception as e:
+            print(f"   读取文件失败 ({file_path.name}): {e}")
+            job_queue.fail(file_path.name, f"读取失败: {e}")
+            return None
     
-    for file_path in target_files:
-        count += 1
+    # 检查是否已有总结（清单过期时顺便更正）
+    if doc.has_summary:
+        manifest.record(file_path.name, doc)
+        job_queue.done(file_path.name)
+        return None
+    if skip_provisional and doc.provisional:
+        return None
         
-        # 检查是否已有总结
-        if has_ai_summary(file_path):
-            continue
-            
-        # 提取 URL
-        url = extract_url_from_file(file_path)
-        if not url:
-            print(f"⏩ 跳过 (无URL): {file_path.name}")
-            continue
-            
-        print(f"👉 处理: {file_path.name}")
+    # 提取 URL
+    url = doc.url
+    if not url:
+        print(f"⏩ 跳过 (无URL): {file_path.name}")
+        job_queue.fail(file_path.name, "笔记没有 URL", retry=False)
+        return None
         
-        # 1. 调用 AI 总结
-        title, content = ai_summarizer.summarize(url)
+    print(f"👉 处理: {file_path.name}")
+    return {'path': file_path, 'url': url, 'doc': doc}
+
+
+def summarize_stage(job: dict, ai_summarizer: AISummarizer, limiter: TokenBucket, cache: AICache,
+                    partial_dir: Path = None, scheduler: AIScheduler = None, job_queue: JobQueue = None,
+                    retries: int = 1) -> dict:
+    """
+    阶段 2：调用 AI 总结（优先使用缓存）
+    流中断时重试 retries 次；接口不支持从中断处续写，每次重试都从头请求，
+    partial_dir 中只保留收到内容最多的一次（供排查，重试不会截断它）；仍然失败时记入任务队列，按退避时间再重试
+    调度器停止派发或后端熔断后，排队中的笔记不再请求，保持原样留给下次运行
+    """
+    cached = cache.get_summary(job['url'])
+    error = ""
+    if cached:
+        title, content = cached
+        print(f"   🗃️ 使用缓存的总结: {job['path'].name}")
+    else:
+        partial_path = partial_dir / f"{text_hash(job['url'])}.md" if partial_dir else None
+        # 每次请求先流式写入临时文件，中断时再与已保留的部分总结比较
+        stream_path = partial_path.with_suffix('.tmp') if partial_path else None
+        if job_queue:
+            job_queue.renew(job['path'].name)
+        for attempt in range(retries + 1):
+            if scheduler:
+                scheduler.concurrency.acquire()
+                if scheduler.should_stop():
+                    scheduler.concurrency.release()
+                    scheduler.defer()
+                    return None
+            limiter.acquire()
+            try:
+                # 单次请求不超过剩余的时间预算
+                result = ai_summarizer.summarize_stream(job['url'], stream_path,
+                                                        timeout=scheduler.remaining() if scheduler else None)
+            except CircuitOpenError:
+                if scheduler:
+                    scheduler.concurrency.release()
+                    scheduler.defer()
+                return None
+            if scheduler:
+                scheduler.concurrency.release(result.elapsed, result.congested)
+            if stream_path and stream_path.exists():
+                if not result.complete and result.content and \
+                        (not partial_path.exists() or stream_path.stat().st_size > partial_path.stat().st_size):
+                    stream_path.replace(partial_path)
+                else:
+                    stream_path.unlink()
+            if result.complete or not result.content:
+                break
+            print(f"   ↩️ AI 流中断 (已收到 {len(result.content)} 字), 第 {attempt + 1} 次重试: {job['path'].name}")
         
+        title, content = (result.title, result.content) if result.complete else ("", "")
+        error = result.error
         if content:
-            # 2. 调用 AI 标签 (如果有内容)
-            tags = []
-            if ai_tagger:
-                # 使用生成的总结内容作为输入，节省 Token 且更精准
-                tags = ai_tagger.generate_tags(content[:2000]) # 限制长度防止超长
-            
-            try:
-                # 读取原文件内容
-                file_content = file_path.read_text(encoding='utf-8')
-                
-                # 注入标签到 FrontMatter
-                if tags:
-                    file_content = inject_tags_into_frontmatter(file_content, tags)
-                    print(f"   🏷️  注入标签: {tags}")
-
-                # 追加总结内容
-                summary_block = f"\n\n## 🤖 AI 深度总结\n\n"
-                if title:
-                    summary_block += f"**{title}**\n\n"
-                summary_block += f"{content}\n"
-                
-                # 写入更新后的内容
-                file_path.write_text(file_content + summary_block, encoding='utf-8')
-                        
-                print(f"   ✅ 已更新文件")
-                processed += 1
-                # 避免触发频率限制，简单休眠
-                time.sleep(2)
-            except Exception as e:
-                print(f"   ❌ 写入失败: {e}")
-            
-        else:
-            print(f"   ⏩ 跳过 (AI未返回内容)")
+            cache.put_summary(job['url'], title, content)
+            if partial_path:
+                partial_path.unlink(missing_ok=True)
+        elif partial_path and partial_path.exists():
+            print(f"   💾 已保留部分总结: {partial_path}")
+    
+    if not content:
+        if job_queue:
+            job_queue.fail(job['path'].name, error or "AI 未返回内容")
+        # 远程没有返回内容时，先写入本地临时摘要（任务仍按退避时间重试）
+        if not job['doc'].provisional and local_summary_stage(job):
+            return job
+        print(f"   ⏩ 跳过 (AI未返回内容): {job['path'].name}")
+        return None
+    
+    job['title'] = title
+    job['content'] = content
+    return job
 
-    print(f"\n📊 AI 处理完成: 扫描 {count} 个文件, 处理 {processed} 个")
+
+def local_summary_stage(job: dict) -> dict:
+    """
+    阶段 2（本地）：从笔记已有的摘要 / 笔记 / 高亮抽取临时摘要，素材不足时跳过
+    """
+    content = local_summarizer.summarize(job['doc'])
+    if not content:
+        print(f"   ⏩ 跳过 (素材不足，无法生成本地摘要): {job['path'].name}")
+        return None
+    print(f"   📎 使用本地临时摘要: {job['path'].name}")
+    job['title'] = ''
+    job['content'] = content
+    job['provisional'] = True
+    return job
+
+
+def tag_stage(jobs: list, ai_tagger, cache: AICache, local_tagger: LocalTagger,
+              scheduler: AIScheduler = None) -> list:
+    """
+    阶段 3：生成标签
+    依次尝试：缓存 -> 本地标签建议（置信度足够时）-> 批量调用 AI 标签 (如果启用)
+    AI 标签熔断时，需要远程标签的笔记不写回（总结已在缓存中），留给下次运行
+    """
+    pending = []
+    for job in jobs:
+        job['tags'] = []
+        # 使用生成的总结内容作为输入，节省 Token 且更精准
+        job['tag_input'] = job['content'][:2000] # 限制长度防止超长
+        tags = cache.get_tags(job['tag_input'])
+        if tags is None:
+            tags = local_tagger.tag(job['tag_input'])
+            if tags:
+                print(f"   🧠 使用本地标签 ({job['path'].name}): {tags}")
+        if tags is not None:
+            job['tags'] = tags
+        elif ai_tagger and not job.get('provisional'):
+            # 临时摘要不请求远程标签，等远程总结生成后再打
+            pending.append(job)
+    
+    if pending:
+        # 多篇笔记打包成一次请求，减少往返次数
+        results = ai_tagger.generate_tags_batch([(index, job['tag_input']) for index, job in enumerate(pending)])
+        for index, job in enumerate(pending):
+            job['tags'] = results.get(index, [])
+            if job['tags']:
+                cache.put_tags(job['tag_input'], job['tags'])
+        if ai_tagger.breaker.is_open:
+            deferred = [job for job in pending if not job['tags']]
+            if deferred:
+                print(f"   ⏸️ AI 标签已熔断，{len(deferred)} 篇笔记留待下次运行")
+                if scheduler:
+                    scheduler.defer(len(deferred))
+                for job in deferred:
+                    job['deferred'] = True
+                return [None if job.get('deferred') else job for job in jobs]
+    return jobs
+
+
+def write_stage(job: dict, manifest: VaultManifest, local_tagger: LocalTagger, job_queue: JobQueue = None,
+                search: SearchIndex = None) -> dict:
+    """
+    阶段 4：注入标签、追加总结并一次写回文件
+    """
+    file_path = job['path']
+    try:
+        with NOTE_WRITE_LOCK:
+            # 总结期间同步线程可能已改写笔记（重复收藏链接、新高亮、原地更新），在磁盘上的最新内容上修改
+            doc = NoteDocument.from_file(file_path)
+            job['doc'] = doc
+            # 注入标签到 FrontMatter
+            if job['tags']:
+                doc.add_tags(job['tags'])
+                print(f"   🏷️  注入标签 ({file_path.name}): {job['tags']}")
+
+            # 追加总结内容
+            doc.set_summary(job['title'], job['content'], provisional=job.get('provisional', False))
+
+            # 写入更新后的内容（每个文件完成后立即落盘）
+            doc.save(file_path)
+        manifest.record(file_path.name, doc)
+        # 新打好标签的笔记也作为本地标签的训练数据
+        local_tagger.add(file_path.name, doc)
+        if search:
+            search.update(file_path.name, doc)
+        # 临时摘要的任务留在队列中，等待远程总结
+        if job_queue and not job.get('provisional'):
+            job_queue.done(file_path.name)
+                
+        print(f"   ✅ 已更新文件: {file_path.name}")
+        return job
+    except Exception as e:
+        print(f"   ❌ 写入失败 ({file_path.name}): {e}")
+        if job_queue:
+            job_queue.fail(file_path.name, f"写入失败: {e}")
+        return None
 
 if __name__ == '__main__':
     # 获取环境变量或使用默认值
     output_dir = os.getenv('OUTPUT_DIR', '30_Resources') + '/Raindrop'
-    process_files(output_dir)
+    concurrency = int(os.getenv('AI_CONCURRENCY', '3'))
+    rate_per_minute = int(os.getenv('AI_RATE_PER_MINUTE', '30'))
+    tag_batch_size = int(os.getenv('AI_TAG_BATCH_SIZE', '8'))
+    max_concurrency = int(os.getenv('AI_MAX_CONCURRENCY', '0'))
+    
+    parser = argparse.ArgumentParser(description='为 Raindrop 笔记补充 AI 总结和标签')
+    parser.add_argument('--backfill', action='store_true', help='处理整个目录中所有缺少 AI 总结的笔记（依据笔记清单）')
+    parser.add_argument('--limit', type=int, default=0, help='最多处理的笔记数（0 表示不限）')
+    parser.add_argument('--profile', action='store_true', help='对 AI 处理过程做 cProfile + tracemalloc 剖析')
+    parser.add_argument('--budget', type=float, default=float(os.getenv('AI_TIME_BUDGET', '0')),
+                        help='时间预算（秒），超出后不再派发新笔记（0 表示不限）')
+    parser.add_argument('--mode', choices=['remote', 'local'], default='remote',
+                        help='remote: 请求远程 AI 总结；local: 只用笔记已有内容生成本地临时摘要（离线、毫秒级）')
+    args = parser.parse_args()
+    
+    with profile('ai_summarizer', enabled=args.profile):
+        process_files(output_dir, concurrency=concurrency, rate_per_minute=rate_per_minute,
+                      backfill=args.backfill, limit=args.limit, tag_batch_size=tag_batch_size,
+                      budget=args.budget, max_concurrency=max_concurrency, mode=args.mode)
+    metrics.write('ai_summarizer')
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+HTTP 客户端公共层
+提供连接池复用的 Session、令牌桶限流、带抖动的指数退避重试，以及 Raindrop 分页并发获取。
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+
+class ApiError(Exception):
+    """
+    API 请求在重试后仍然失败
+    """
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器
+    rate 为每秒补充的令牌数，capacity 为允许的突发请求数
+    """
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        获取一个令牌，不足时阻塞等待
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        服务端要求暂停（Retry-After / 配额耗尽）时，暂停所有调用方
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class ApiClient:
+    """
+    带连接池、限流和重试的 HTTP 客户端
+    """
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    ETAG_CACHE_SIZE = 64
+
+    def __init__(self, headers: dict = None, rate_per_minute: int = 120, burst: int = 10,
+                 max_retries: int = 5, timeout: tuple = (5, 30), pool_size: int = 10, name: str = 'http'):
+        # 指标中的 api 标签
+        self.name = name
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.bucket = TokenBucket(rate_per_minute / 60, burst)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        # 条件请求缓存：(url, params) -> (ETag, 响应数据)
+        self.etags = {}
+        self.etag_lock = threading.Lock()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        指数退避 + 全抖动
+        """
+        return random.uniform(0, min(30, 0.5 * (2 ** attempt)))
+
+    def retry_after(self, response: requests.Response) -> float:
+        """
+        解析 Retry-After（秒）或 X-RateLimit-Reset（Unix 时间戳）
+        """
+        value = response.headers.get('Retry-After')
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+        reset = response.headers.get('X-RateLimit-Reset')
+        if reset:
+            try:
+                return max(0.0, float(reset) - time.time())
+            except ValueError:
+                pass
+        return 0.0
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        发送请求，对网络错误、429 和 5xx 自动重试
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                metrics.inc('api_retries_total', api=self.name)
+            with metrics.timer('api_wait_seconds', api=self.name):
+                self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                metrics.inc('api_errors_total', api=self.name, error=type(e).__name__)
+                last_error = e
+                time.sleep(self.backoff(attempt))
+                continue
+            metrics.observe('api_request_seconds', time.perf_counter() - start, api=self.name)
+            metrics.inc('api_requests_total', api=self.name, status=response.status_code)
+            metrics.inc('api_response_bytes_total', len(response.content), api=self.name)
+
+            # 配额即将耗尽时主动暂停，避免撞上 429
+            if response.headers.get('X-RateLimit-Remaining') == '0':
+                self.bucket.pause(self.retry_after(response))
+
+            if response.status_code in self.RETRY_STATUS:
+                last_error = ApiError(f"{response.status_code} - {response.text[:200]}")
+                if response.status_code == 429:
+                    metrics.inc('api_rate_limited_total', api=self.name)
+                wait = self.retry_after(response) if response.status_code == 429 else 0.0
+                if wait:
+                    self.bucket.pause(wait)
+                else:
+                    time.sleep(self.backoff(attempt))
+                continue
+
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                raise ApiError(str(e)) from e
+            return response
+
+        metrics.inc('api_failures_total', api=self.name)
+        raise ApiError(f"{method} {url} 重试 {self.max_retries} 次后仍失败: {last_error}")
+
+    def get_json(self, url: str, params: dict = None) -> dict:
+        """
+        GET 并解析 JSON；服务端支持 ETag 时使用条件请求，304 直接返回上次的数据
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        with self.etag_lock:
+            cached = self.etags.get(key)
+        headers = {'If-None-Match': cached[0]} if cached else None
+        
+        response = self.request('GET', url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            metrics.inc('api_not_modified_total', api=self.name)
+            return cached[1]
+        
+        data = response.json()
+        etag = response.headers.get('ETag')
+        if etag:
+            with self.etag_lock:
+                self.etags[key] = (etag, data)
+                # 只保留最近的若干条，避免常驻进程内存增长
+                while len(self.etags) > self.ETAG_CACHE_SIZE:
+                    self.etags.pop(next(iter(self.etags)))
+        return data
+
+
+class RaindropClient(ApiClient):
+    """
+    Raindrop REST API 客户端
+    Raindrop 限制为每个用户每分钟 120 次请求
+    """
+    def __init__(self, api_token: str, base_url: str = 'https://api.raindrop.io/rest/v1',
+                 concurrency: int = 4, **kwargs):
+        super().__init__(headers={
+            'Authorization': f'Bearer {api_token}',
+            'Content-Type': 'application/json'
+        }, name='raindrop', **kwargs)
+        self.base_url = base_url
+        self.concurrency = concurrency
+
+    def get_page(self, path: str, params: dict, page: int, per_page: int) -> dict:
+        return self.get_json(f"{self.base_url}{path}", dict(params, page=page, perpage=per_page))
+
+    def get_all_pages(self, path: str, params: dict = None, per_page: int = 50) -> list:
+        """
+        获取所有分页的 items
+        先请求第一页拿到 count，再并发请求剩余页，结果按页序合并
+        任意一页失败都会抛出 ApiError，不会静默截断
+        """
+        params = params or {}
+        first = self.get_page(path, params, 0, per_page)
+        items = list(first.get('items', []))
+        count = first.get('count', len(items))
+        pages = (count + per_page - 1) // per_page
+
+        if pages <= 1 or len(items) < per_page:
+            return items
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = executor.map(lambda page: self.get_page(path, params, page, per_page), range(1, pages))
+            for data in results:
+                items.extend(data.get('items', []))
+
+        return items
+
+    def iter_pages(self, path: str, params: dict = None, per_page: int = 50, start_page: int = 0):
+        """
+        逐页惰性获取，生成 (页码, items)，内存中只保留当前页
+        后台预取下一页，调用方处理当前页时网络请求已在进行；取到不满一页时结束
+        """
+        params = params or {}
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self.get_page, path, params, start_page, per_page)
+            page = start_page
+            while True:
+                items = future.result().get('items', [])
+                if len(items) == per_page:
+                    future = executor.submit(self.get_page, path, params, page + 1, per_page)
+                if items:
+                    yield page, items
+                if len(items) < per_page:
+                    return
+                page += 1
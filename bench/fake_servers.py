@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+基准测试用的本地替身服务
+- Raindrop REST：按需生成 N 个书签，支持分页、created / lastUpdate 搜索过滤和每分钟限流
+- Dedao SSE：按配置的间隔推送 data: 事件
+- GLM：返回单条或批量标签结果
+"""
+
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+# 第 i 个书签属于 COLLECTION_IDS[i % 4]
+COLLECTION_IDS = (-1, 1, 2, 3)
+COLLECTIONS = [{'_id': 1, 'title': '技术'}, {'_id': 2, 'title': '阅读'}]
+CHILD_COLLECTIONS = [{'_id': 3, 'title': '前端', 'parent': {'$id': 1}}]
+
+
+class FakeRaindrop:
+    """
+    Raindrop 书签数据：第 i 个书签创建于 base_time 之前 i 分钟（按 -created 排序）
+    """
+    def __init__(self, count: int, rate_per_minute: int = 0, latency: float = 0.0):
+        self.count = count
+        self.rate_per_minute = rate_per_minute
+        self.latency = latency
+        self.base_time = datetime.now(timezone.utc).replace(microsecond=0)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+        self.requests = 0
+        self.throttled = 0
+
+    def created_at(self, index: int) -> datetime:
+        return self.base_time - timedelta(minutes=index)
+
+    def item(self, index: int) -> dict:
+        created = self.created_at(index).isoformat().replace('+00:00', '.000Z')
+        return {
+            '_id': 100000000 + self.count - index,
+            'title': f'基准测试书签 {index} Benchmark bookmark',
+            'link': f'https://example.com/articles/{index}?utm_source=bench',
+            'excerpt': '这是一段用于基准测试的摘要。' * 3,
+            'note': '我的笔记' if index % 5 == 0 else '',
+            'highlights': [{'_id': f'h{index}', 'text': f'高亮 {index}'}] if index % 3 == 0 else [],
+            'tags': ['bench', f'tag{index % 20}'],
+            'created': created,
+            'lastUpdate': created,
+            'cover': '',
+            'domain': 'example.com',
+            'collection': {'$id': COLLECTION_IDS[index % 4]},
+            'important': index % 10 == 0
+        }
+
+    def highlights_page(self, page: int, per_page: int) -> dict:
+        """
+        /highlights 列表：每 3 个书签有一条高亮，按创建时间倒序
+        """
+        count = (self.count + 2) // 3
+        items = []
+        for n in range(page * per_page, min((page + 1) * per_page, count)):
+            raindrop = self.item(n * 3)
+            items.append(dict(raindrop['highlights'][0], raindropRef=raindrop['_id'], created=raindrop['created']))
+        return {'result': True, 'items': items}
+
+    def allow(self) -> bool:
+        """
+        固定窗口限流
+        """
+        if not self.rate_per_minute:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 60:
+                self.window_start, self.window_requests = now, 0
+            self.window_requests += 1
+            return self.window_requests <= self.rate_per_minute
+
+    def visible_count(self, search: str) -> int:
+        """
+        按 created:>DATE / lastUpdate:>DATE 过滤后的书签数
+        """
+        match = re.search(r'(?:created|lastUpdate):>(\d{4}-\d{2}-\d{2})', search or '')
+        if not match:
+            return self.count
+        since = datetime.strptime(match.group(1), '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(days=1)
+        minutes = int((self.base_time - since).total_seconds() // 60)
+        return max(0, min(self.count, minutes + 1))
+
+    def page(self, page: int, per_page: int, search: str, collection_id: int = 0) -> dict:
+        visible = self.visible_count(search)
+        start = page * per_page
+        if collection_id == 0:
+            indexes = range(start, min(start + per_page, visible))
+            count = visible
+        else:
+            # 只属于该收藏夹的书签：offset, offset + 4, ...
+            offset = COLLECTION_IDS.index(collection_id)
+            count = max(0, (visible - offset + len(COLLECTION_IDS) - 1) // len(COLLECTION_IDS))
+            indexes = [offset + n * len(COLLECTION_IDS) for n in range(start, min(start + per_page, count))]
+        return {'result': True, 'items': [self.item(index) for index in indexes], 'count': count}
+
+
+class FakeAI:
+    """
+    Dedao SSE / GLM 替身配置
+    """
+    def __init__(self, events: int = 20, event_interval: float = 0.01, tag_latency: float = 0.05):
+        self.events = events
+        self.event_interval = event_interval
+        self.tag_latency = tag_latency
+        self.streams = 0
+        self.tag_requests = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(raindrop: FakeRaindrop, ai: FakeAI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, data: dict, headers: dict = None):
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path == '/rest/v1/collections':
+                self.send_json(200, {'result': True, 'items': COLLECTIONS})
+                return
+            if parts.path == '/rest/v1/collections/childrens':
+                self.send_json(200, {'result': True, 'items': CHILD_COLLECTIONS})
+                return
+            if parts.path == '/rest/v1/highlights':
+                query = parse_qs(parts.query)
+                self.send_json(200, raindrop.highlights_page(int(query.get('page', ['0'])[0]),
+                                                             int(query.get('perpage', ['25'])[0])))
+                return
+            if not parts.path.startswith('/rest/v1/raindrops/'):
+                self.send_json(404, {'result': False})
+                return
+            with raindrop.lock:
+                raindrop.requests += 1
+            if not raindrop.allow():
+                with raindrop.lock:
+                    raindrop.throttled += 1
+                self.send_json(429, {'result': False}, {'Retry-After': '1'})
+                return
+            if raindrop.latency:
+                time.sleep(raindrop.latency)
+            query = parse_qs(parts.query)
+            page = int(query.get('page', ['0'])[0])
+            per_page = int(query.get('perpage', ['25'])[0])
+            search = query.get('search', [''])[0]
+            collection_id = int(parts.path.rsplit('/', 1)[-1] or 0)
+            self.send_json(200, raindrop.page(page, per_page, search, collection_id))
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if self.path.startswith('/stream'):
+                self.stream_summary(payload)
+            elif self.path.startswith('/chat'):
+                self.chat(payload)
+            else:
+                self.send_json(404, {})
+
+        def stream_summary(self, payload: dict):
+            with ai.lock:
+                ai.streams += 1
+            url = payload.get('attachments', [{}])[0].get('url', '')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            messages = [{'summary_title': f'总结 {url}'}]
+            messages += [{'content': f'第 {n} 段总结内容，介绍文章的核心观点。\n'} for n in range(ai.events)]
+            for message in messages:
+                event = {'data': {'msg': json.dumps(message, ensure_ascii=False)}}
+                self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(ai.event_interval)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def chat(self, payload: dict):
+            with ai.lock:
+                ai.tag_requests += 1
+            time.sleep(ai.tag_latency)
+            prompt = payload['messages'][-1]['content']
+            ids = re.findall(r'^ITEM (\S+) START$', prompt, re.MULTILINE)
+            if ids:
+                content = json.dumps({'results': [{'id': item_id, 'tags': ['基准', '测试']} for item_id in ids]})
+            else:
+                content = json.dumps({'tags': ['基准', '测试']})
+            self.send_json(200, {'choices': [{'message': {'content': content}}]})
+
+    return Handler
+
+
+def start_server(raindrop: FakeRaindrop, ai: FakeAI) -> ThreadingHTTPServer:
+    """
+    在随机端口启动替身服务（后台线程），返回 server，地址为 server.server_address
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(raindrop, ai))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+吞吐基准测试
+在本地替身服务上测量 RaindropSync.sync 的书签/秒、process_files 的笔记/秒、峰值内存和各阶段耗时，
+结果写入 JSON 文件，可用 --compare 与旧版本的结果对比。
+
+用法:
+    python bench/run_bench.py --sizes 100 10000 100000 --output bench/results.json
+    python bench/run_bench.py --compare bench/results-old.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from fake_servers import FakeAI, FakeRaindrop, start_server
+
+
+def peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 / 1024, 1)
+
+
+def run_child(size: int, base_url: str, ai_notes: int, concurrency: int) -> dict:
+    """
+    子进程中执行一次同步 + AI 处理，每个规模独立进程，峰值内存互不影响
+    """
+    from ai_summarizer import process_files
+    from api_client import RaindropClient
+    from metrics import metrics
+    from raindrop_api_sync import RaindropSync
+
+    result = {'bookmarks': size}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            'GITHUB_WORKSPACE': tmp,
+            'DEDAO_API_TOKEN': 'bench',
+            'ZHIPU_API_KEY': 'bench',
+            'DEDAO_API_URL': f'{base_url}/stream',
+            'ZHIPU_API_URL': f'{base_url}/chat'
+        })
+        # 客户端限速放宽，测量的是本项目自身的吞吐
+        client = RaindropClient('bench', f'{base_url}/rest/v1', rate_per_minute=600000, burst=100)
+        syncer = RaindropSync('bench', tmp, client=client)
+        days = size // 1440 + 2
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            syncer.sync(days)
+            sync_seconds = time.perf_counter() - start
+        result['sync'] = {
+            'seconds': round(sync_seconds, 3),
+            'created': len(syncer.created_files),
+            'bookmarks_per_second': round(size / sync_seconds, 1) if sync_seconds else 0,
+            'peak_rss_mb': peak_rss_mb()
+        }
+
+        stats = {}
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            written = process_files(str(syncer.output_dir), concurrency=concurrency, rate_per_minute=600000,
+                                    limit=ai_notes, tag_batch_wait=0.2, stats=stats)
+            ai_seconds = time.perf_counter() - start
+        result['ai'] = {
+            'notes': len(written),
+            'seconds': round(ai_seconds, 3),
+            'notes_per_second': round(len(written) / ai_seconds, 2) if ai_seconds else 0,
+            'stages': {
+                name: {
+                    'processed': stat['processed'],
+                    'errors': stat['errors'],
+                    'busy_seconds': stat['busy_seconds'],
+                    'avg_latency_ms': round(stat['busy_seconds'] * 1000 / stat['processed'], 2)
+                    if stat['processed'] else 0,
+                    'max_queue_depth': stat['max_queue_depth']
+                }
+                for name, stat in stats.items()
+            }
+        }
+    result['peak_rss_mb'] = peak_rss_mb()
+    result['metrics'] = metrics.report()
+    return result
+
+
+def run_size(size: int, args) -> dict:
+    """
+    在父进程启动替身服务，子进程运行被测代码，服务端的开销不计入被测进程
+    """
+    raindrop = FakeRaindrop(size, rate_per_minute=args.raindrop_rate, latency=args.raindrop_latency)
+    ai = FakeAI(events=args.sse_events, event_interval=args.sse_interval, tag_latency=args.tag_latency)
+    server = start_server(raindrop, ai)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        command = [sys.executable, __file__, '--child', str(size), '--base-url', base_url,
+                   '--ai-notes', str(args.ai_notes), '--concurrency', str(args.concurrency)]
+        output = subprocess.run(command, capture_output=True, text=True)
+        if output.returncode != 0:
+            raise RuntimeError(f"规模 {size} 运行失败:\n{output.stderr[-2000:]}")
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+    finally:
+        server.shutdown()
+    result['server'] = {
+        'raindrop_requests': raindrop.requests,
+        'raindrop_throttled': raindrop.throttled,
+        'sse_streams': ai.streams,
+        'tag_requests': ai.tag_requests
+    }
+    return result
+
+
+def git_revision() -> str:
+    rev = subprocess.run(['git', '-C', str(BENCH_DIR.parent), 'rev-parse', '--short', 'HEAD'],
+                         capture_output=True, text=True)
+    return rev.stdout.strip() if rev.returncode == 0 else 'unknown'
+
+
+def compare(old_path: Path, new: dict):
+    """
+    按规模对比两次结果的关键指标
+    """
+    previous = json.loads(old_path.read_text(encoding='utf-8'))
+    old = {item['bookmarks']: item for item in previous['results']}
+    print(f"\n🔍 对比 {old_path} ({previous['meta']['git_rev']})")
+    metrics = [('sync', 'bookmarks_per_second'), ('ai', 'notes_per_second'), (None, 'peak_rss_mb')]
+    for item in new['results']:
+        before = old.get(item['bookmarks'])
+        if not before:
+            continue
+        for section, key in metrics:
+            old_value = before[section][key] if section else before[key]
+            new_value = item[section][key] if section else item[key]
+            change = (new_value - old_value) / old_value * 100 if old_value else 0
+            print(f"   - {item['bookmarks']} {key}: {old_value} -> {new_value} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Raindrop 同步 / AI 流水线基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000], help='书签数量')
+    parser.add_argument('--output', default=str(BENCH_DIR / 'results.json'), help='结果 JSON 文件')
+    parser.add_argument('--compare', help='与之前的结果文件对比')
+    parser.add_argument('--ai-notes', type=int, default=200, help='每个规模最多做 AI 处理的笔记数')
+    parser.add_argument('--concurrency', type=int, default=8, help='AI 流水线并发数')
+    parser.add_argument('--raindrop-rate', type=int, default=0, help='替身 Raindrop 每分钟请求上限（0 为不限）')
+    parser.add_argument('--raindrop-latency', type=float, default=0.0, help='替身 Raindrop 每次请求延迟（秒）')
+    parser.add_argument('--sse-events', type=int, default=20, help='每个总结流的事件数')
+    parser.add_argument('--sse-interval', type=float, default=0.01, help='SSE 事件间隔（秒）')
+    parser.add_argument('--tag-latency', type=float, default=0.05, help='GLM 标签请求延迟（秒）')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_child(args.child, args.base_url, args.ai_notes, args.concurrency)))
+        return
+
+    report = {
+        'meta': {
+            'git_rev': git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform()
+        },
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('child', 'base_url', 'output', 'compare')},
+        'results': []
+    }
+    for size in args.sizes:
+        print(f"⏱️ 规模 {size} ...")
+        result = run_size(size, args)
+        report['results'].append(result)
+        print(f"   同步 {result['sync']['bookmarks_per_second']} 书签/s, "
+              f"AI {result['ai']['notes_per_second']} 笔记/s, 峰值内存 {result['peak_rss_mb']} MB")
+
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"💾 结果已写入 {args.output}")
+
+    if args.compare:
+        compare(Path(args.compare), report)
+
+
+if __name__ == '__main__':
+    main()
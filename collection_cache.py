@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Raindrop 收藏夹元数据缓存
+书签只带收藏夹 $id，这里一次性从 /collections 和 /collections/childrens 取回全部收藏夹，
+拼出嵌套路径（如 "技术/前端"），缓存在 .sync/collections.json，过期或遇到未知 $id 时才刷新。
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+
+from api_client import ApiError
+
+# Raindrop 的系统收藏夹
+SYSTEM_COLLECTIONS = {-1: 'Unsorted', -99: 'Trash'}
+
+
+class CollectionCache:
+    """
+    收藏夹 $id -> 标题 / 父收藏夹 / 嵌套路径
+    """
+    VERSION = 1
+    # 两次刷新尝试的最短间隔（秒），常驻进程中遇到未知 $id 或获取失败时不会频繁请求
+    RETRY_INTERVAL = 600
+
+    def __init__(self, client, cache_path: Path, max_age_hours: float = 24):
+        self.client = client
+        self.cache_path = Path(cache_path)
+        self.max_age = max_age_hours * 3600
+        self.collections = {}
+        self.fetched_at = 0.0
+        self.attempted_at = 0.0
+        self.paths = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ 读取收藏夹缓存失败，将重新获取: {e}")
+            return
+        if data.get('version') == self.VERSION:
+            self.collections = data.get('collections', {})
+            self.fetched_at = data.get('fetched_at', 0.0)
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix('.tmp')
+        with self.lock:
+            data = {'version': self.VERSION, 'fetched_at': self.fetched_at, 'collections': self.collections}
+            self.dirty = False
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+        tmp_path.replace(self.cache_path)
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self.fetched_at > self.max_age
+
+    def refresh(self):
+        """
+        重新获取全部收藏夹（两次请求），失败时保留旧缓存并抛出 ApiError
+        """
+        self.attempted_at = time.time()
+        collections = {}
+        try:
+            for path in ('/collections', '/collections/childrens'):
+                for item in self.client.get_json(f"{self.client.base_url}{path}").get('items', []):
+                    parent = item.get('parent') or {}
+                    collections[str(item['_id'])] = {
+                        'title': item.get('title', ''),
+                        'parent': parent.get('$id') if isinstance(parent, dict) else None
+                    }
+        except KeyError as e:
+            raise ApiError(f"收藏夹数据缺少字段: {e}") from e
+        self.collections = collections
+        self.fetched_at = time.time()
+        self.paths = {}
+        self.dirty = True
+        print(f"📂 已刷新收藏夹缓存: {len(collections)} 个收藏夹")
+
+    def can_retry(self) -> bool:
+        return time.time() - self.attempted_at > self.RETRY_INTERVAL
+
+    def ensure_fresh(self):
+        """
+        缓存过期时刷新，失败时继续使用旧缓存
+        """
+        with self.lock:
+            if self.stale and self.can_retry():
+                try:
+                    self.refresh()
+                except ApiError as e:
+                    print(f"⚠️ 获取收藏夹列表失败，使用缓存: {e}")
+
+    def ids(self) -> list:
+        """
+        所有用户收藏夹的 $id（加上 Unsorted）
+        分片同步依赖完整的收藏夹列表，这里总是重新获取（两次请求），失败时抛出 ApiError
+        """
+        with self.lock:
+            self.refresh()
+            return [int(collection_id) for collection_id in self.collections] + [-1]
+
+    def path(self, collection_id, fallback: str = 'Unsorted') -> str:
+        """
+        返回收藏夹的嵌套路径，如 "技术/前端"
+        """
+        try:
+            collection_id = int(collection_id)
+        except (TypeError, ValueError):
+            return fallback
+        if collection_id in SYSTEM_COLLECTIONS:
+            return SYSTEM_COLLECTIONS[collection_id]
+
+        self.ensure_fresh()
+        with self.lock:
+            if str(collection_id) not in self.collections and self.can_retry():
+                # 新建的收藏夹：刷新一次（之后 RETRY_INTERVAL 内不再重试）
+                try:
+                    self.refresh()
+                except ApiError as e:
+                    print(f"⚠️ 获取收藏夹列表失败: {e}")
+            if collection_id not in self.paths:
+                self.paths[collection_id] = self.build_path(collection_id) or fallback
+            return self.paths[collection_id]
+
+    def build_path(self, collection_id: int) -> str:
+        titles = []
+        seen = set()
+        current = str(collection_id)
+        # 沿 parent 向上拼接，防御循环引用
+        while current in self.collections and current not in seen:
+            seen.add(current)
+            entry = self.collections[current]
+            titles.append(entry['title'].replace('/', '-'))
+            current = str(entry['parent']) if entry.get('parent') is not None else None
+        return '/'.join(reversed(titles))
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+重复收藏检测
+同一篇文章经常被重复收藏：带 utm_* 参数、通过手机分享链接、或者换了标题在另一天再存一次。
+这里维护两张表（保存在 .sync/dedup.json）：
+- 规范化 URL -> raindrop _id：字典查找，O(1)；规范化 URL 相同才判为重复收藏
+- 标题 + 摘要的 64 位 SimHash 指纹：按 4 个 16 位分段建倒排，汉明距离 <= 3 的指纹必有一段完全相同，
+  只需比较同段的少量候选；指纹相近只说明内容相似（如同一主题的不同文章），仍然新建笔记，只做交叉链接
+"""
+
+import hashlib
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from local_tagger import tokenize
+
+# 不影响内容的跟踪 / 分享参数（from / source / ref / si / feature 等在不少站点上决定页面内容，不在此列）
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'mc_cid', 'mc_eid', 'spm', 'share_token',
+    'share_source', 'share_medium', 'share_from', 'sharer_shareid', 'sharer_sharetime',
+    'ref_src', 'ref_url', 'isappinstalled', 'scene', 'clicktime',
+    'enterid', 'chksm', 'xtrack', 'wfr', 'vd_source'
+}
+# 移动版 / 带 www 的域名与桌面版视为同一站点
+HOST_PREFIXES = ('www.', 'm.', 'mobile.', 'amp.')
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+# 少于这么多词的文本指纹不可靠，不参与相似检测
+MIN_TOKENS = 8
+
+
+@lru_cache(maxsize=4096)
+def canonical_url(url: str) -> str:
+    """
+    规范化 URL：统一 https、去掉 www. / m. 前缀、默认端口、fragment、跟踪参数和末尾斜杠，参数排序；
+    youtu.be 短链展开为 youtube.com/watch?v=
+    """
+    parts = urlsplit(url.strip())
+    if not parts.netloc:
+        return url.strip()
+    host = (parts.hostname or '').lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix) and host.count('.') > 1:
+            host = host[len(prefix):]
+            break
+    if parts.port and parts.port not in (80, 443):
+        host = f'{host}:{parts.port}'
+
+    path = parts.path.rstrip('/') or '/'
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not k.lower().startswith('utm_') and k.lower() not in TRACKING_PARAMS]
+
+    if host == 'youtu.be' and path != '/':
+        host, query, path = 'youtube.com', [('v', path.strip('/'))] + query, '/watch'
+    return urlunsplit(('https', host, path, urlencode(sorted(query)), ''))
+
+
+@lru_cache(maxsize=1024)
+def simhash(text: str) -> int:
+    """
+    64 位 SimHash；词数不足时返回 0（不参与相似检测）
+    文本中的数字（期号、第几部分）权重等于总词数，系列文章的不同期不会被判为重复
+    """
+    tokens = tokenize(text)
+    if len(tokens) < MIN_TOKENS:
+        return 0
+    vectors = [token_bits(token) for token in tokens]
+    for number in re.findall(r'\d+', text):
+        vectors.append(tuple(bit * len(tokens) for bit in token_bits(number)))
+    # 按位求和（zip 转置后逐位 sum，避免 Python 层的双重循环）
+    weights = map(sum, zip(*vectors))
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+@lru_cache(maxsize=65536)
+def token_bits(token: str) -> tuple:
+    """
+    词的 64 位哈希展开为 ±1 向量（中文二字组大量重复，缓存后基本只算一次）
+    """
+    value = int.from_bytes(hashlib.md5(token.encode('utf-8')).digest()[:8], 'big')
+    return tuple(1 if value >> bit & 1 else -1 for bit in range(SIMHASH_BITS))
+
+
+def fingerprint_text(raindrop: dict) -> str:
+    return f"{raindrop.get('title', '')}\n{raindrop.get('excerpt', '')}"
+
+
+class DedupIndex:
+    """
+    规范化 URL / SimHash 指纹索引，以及被合并的重复书签 _id -> 保留的书签 _id
+    """
+    VERSION = 1
+
+    def __init__(self, index_path: Path, max_distance: int = 3):
+        self.index_path = Path(index_path)
+        self.max_distance = max_distance
+        self.urls = {}
+        # raindrop _id -> SimHash（十六进制字符串保存）
+        self.fingerprints = {}
+        self.duplicates = {}
+        # 分段倒排：(段序号, 段值) -> raindrop _id 集合
+        self.bands = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not self.index_path.exists():
+            return
+        try:
+            data = json.loads(self.index_path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ 读取去重索引失败，将重新建立: {e}")
+            return
+        if data.get('version') != self.VERSION:
+            return
+        self.urls = data.get('urls', {})
+        self.duplicates = data.get('duplicates', {})
+        for raindrop_id, value in data.get('fingerprints', {}).items():
+            self.add_fingerprint(raindrop_id, int(value, 16))
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'version': self.VERSION,
+            'urls': self.urls,
+            'fingerprints': {raindrop_id: f'{value:016x}' for raindrop_id, value in self.fingerprints.items()},
+            'duplicates': self.duplicates
+        }
+        tmp_path = self.index_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True), encoding='utf-8')
+        tmp_path.replace(self.index_path)
+        self.dirty = False
+
+    @staticmethod
+    def band_keys(value: int) -> list:
+        width = SIMHASH_BITS // SIMHASH_BANDS
+        return [(band, value >> (band * width) & ((1 << width) - 1)) for band in range(SIMHASH_BANDS)]
+
+    def add_fingerprint(self, raindrop_id: str, value: int):
+        old = self.fingerprints.get(raindrop_id)
+        if old == value:
+            return
+        if old is not None:
+            for key in self.band_keys(old):
+                self.bands.get(key, set()).discard(raindrop_id)
+        self.fingerprints[raindrop_id] = value
+        for key in self.band_keys(value):
+            self.bands.setdefault(key, set()).add(raindrop_id)
+
+    def add(self, raindrop_id, raindrop: dict):
+        """
+        登记一个已有笔记的书签
+        """
+        raindrop_id = str(raindrop_id)
+        url = raindrop.get('link', '')
+        if url:
+            key = canonical_url(url)
+            if self.urls.get(key) is None:
+                self.urls[key] = raindrop_id
+                self.dirty = True
+        value = simhash(fingerprint_text(raindrop))
+        if value and self.fingerprints.get(raindrop_id) != value:
+            self.add_fingerprint(raindrop_id, value)
+            self.dirty = True
+
+    def find(self, raindrop: dict) -> str:
+        """
+        规范化 URL 相同的已有书签 _id（重复收藏），没有时返回 None
+        """
+        raindrop_id = str(raindrop.get('_id', ''))
+        url = raindrop.get('link', '')
+        if not url:
+            return None
+        owner = self.urls.get(canonical_url(url))
+        return owner if owner and owner != raindrop_id else None
+
+    def similar(self, raindrop: dict) -> tuple:
+        """
+        标题 + 摘要指纹最接近的已有书签，返回 (raindrop _id, 汉明距离)，超过 max_distance 时返回 (None, 0)
+        """
+        raindrop_id = str(raindrop.get('_id', ''))
+        value = simhash(fingerprint_text(raindrop))
+        if not value:
+            return None, 0
+        candidates = set()
+        for key in self.band_keys(value):
+            candidates |= self.bands.get(key, set())
+        candidates.discard(raindrop_id)
+        best = min(candidates, key=lambda other: bin(value ^ self.fingerprints[other]).count('1'), default=None)
+        if best is None:
+            return None, 0
+        distance = bin(value ^ self.fingerprints[best]).count('1')
+        return (best, distance) if distance <= self.max_distance else (None, 0)
+
+    def rebuild(self, manifest_entries: dict):
+        """
+        去重索引不存在时，从笔记清单恢复 URL 表（指纹随之后的同步逐步补全）
+        """
+        for entry in manifest_entries.values():
+            raindrop_id, url = entry.get('raindrop_id'), entry.get('url')
+            if raindrop_id and url:
+                self.urls.setdefault(canonical_url(url), str(raindrop_id))
+                self.dirty = True
+
+    def mark_duplicate(self, raindrop_id, kept_id):
+        self.duplicates[str(raindrop_id)] = str(kept_id)
+        self.dirty = True
+
+    def unmark_duplicate(self, raindrop_id):
+        if self.duplicates.pop(str(raindrop_id), None) is not None:
+            self.dirty = True
+
+    def kept_for(self, raindrop_id) -> str:
+        """
+        已被合并的重复书签对应保留的书签 _id
+        """
+        return self.duplicates.get(str(raindrop_id))
+
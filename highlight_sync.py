@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Raindrop 高亮增量同步
+通过 /highlights 列表接口（按创建时间倒序、每页 50 条）只拉取游标之后的新高亮，
+按书签分组后追加到已有笔记的「✨ 高亮标注」章节，不重写笔记其他部分。
+整个书签库的新高亮通常只需一两次请求，而不是每个书签一次。
+"""
+
+import json
+from pathlib import Path
+
+from metrics import metrics
+from note_document import NOTE_WRITE_LOCK, NoteDocument
+
+HIGHLIGHTS_HEADING = '## ✨ 高亮标注'
+# 新建高亮章节时放在封面之前，与同步生成的笔记顺序一致
+HIGHLIGHTS_BEFORE = '## 🖼️ 封面'
+
+
+class HighlightSync:
+    """
+    高亮游标 + 每个书签已写入的高亮 _id（保存在 .sync/highlights.json）
+    """
+    VERSION = 1
+
+    def __init__(self, syncer, state_path: Path, per_page: int = 50):
+        self.syncer = syncer
+        self.state_path = Path(state_path)
+        self.per_page = per_page
+        # 已处理到的 (created, _id)
+        self.cursor = {}
+        # raindrop _id -> 已写入笔记的高亮 _id 列表
+        self.seen = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not self.state_path.exists():
+            return
+        try:
+            data = json.loads(self.state_path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ 读取高亮同步状态失败，将重新同步高亮: {e}")
+            return
+        if data.get('version') == self.VERSION:
+            self.cursor = data.get('cursor', {})
+            self.seen = data.get('seen', {})
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix('.tmp')
+        data = {'version': self.VERSION, 'cursor': self.cursor, 'seen': self.seen}
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+        tmp_path.replace(self.state_path)
+        self.dirty = False
+
+    def mark_rendered(self, raindrop_id, highlights: list):
+        """
+        笔记刚从书签自带的 highlights 渲染过，这些高亮记为已写入，之后不必再读取笔记比对
+        """
+        ids = [str(highlight['_id']) for highlight in highlights if isinstance(highlight, dict) and highlight.get('_id')]
+        if not ids:
+            return
+        seen = self.seen.setdefault(str(raindrop_id), [])
+        new_ids = [highlight_id for highlight_id in ids if highlight_id not in seen]
+        if new_ids:
+            seen.extend(new_ids)
+            self.dirty = True
+
+    def is_new(self, highlight: dict) -> bool:
+        current = (self.cursor.get('created', ''), self.cursor.get('last_id', ''))
+        return (highlight.get('created', ''), str(highlight.get('_id', ''))) > current
+
+    def fetch_new(self) -> list:
+        """
+        逐页获取游标之后的高亮，遇到整页都不新于游标时停止
+        """
+        highlights = []
+        page = 0
+        while True:
+            data = self.syncer.client.get_page('/highlights', {}, page, self.per_page)
+            items = data.get('items', [])
+            new_items = [item for item in items if self.is_new(item)]
+            highlights.extend(new_items)
+            if len(items) < self.per_page or not new_items:
+                return highlights
+            page += 1
+
+    def apply(self, highlights: list) -> int:
+        """
+        把高亮按书签分组追加到对应笔记，返回更新的笔记数
+        还没有笔记的书签跳过（笔记创建时会从书签自带的 highlights 渲染）
+        """
+        groups = {}
+        for highlight in sorted(highlights, key=lambda item: item.get('created', '')):
+            raindrop_id = str(highlight.get('raindropRef', ''))
+            # 已写入的高亮不再读取笔记
+            if raindrop_id and highlight.get('text') and \
+                    str(highlight.get('_id', '')) not in self.seen.get(raindrop_id, ()):
+                groups.setdefault(raindrop_id, []).append(highlight)
+
+        updated = 0
+        for raindrop_id, items in groups.items():
+            entry = self.syncer.index.get(raindrop_id)
+            if not entry:
+                continue
+            file_path = self.syncer.output_dir / entry['path']
+            try:
+                if self.append(raindrop_id, file_path, entry['path'], items):
+                    updated += 1
+            except OSError as e:
+                print(f"❌ 写入高亮失败 ({entry['path']}): {e}")
+        return updated
+
+    def append(self, raindrop_id: str, file_path: Path, filename: str, highlights: list) -> bool:
+        """
+        追加一篇笔记的新高亮，按高亮 _id 去重（首次同步时再按文本去重，避免与创建笔记时渲染的重复）
+        """
+        with NOTE_WRITE_LOCK:
+            if not file_path.exists():
+                return False
+            doc = NoteDocument.from_file(file_path)
+            seen = self.seen.setdefault(raindrop_id, [])
+            # 按整段引用比较：较短的新高亮可能是已有高亮的片段，子串判断会把它误判为重复
+            existing = {paragraph.strip() for paragraph in (doc.get_section(HIGHLIGHTS_HEADING) or '').split('\n\n')}
+            quotes = []
+            for highlight in highlights:
+                highlight_id = str(highlight.get('_id', ''))
+                quote = f"> {highlight['text']}"
+                if highlight_id in seen:
+                    continue
+                seen.append(highlight_id)
+                self.dirty = True
+                if quote.strip() not in existing and quote not in quotes:
+                    quotes.append(quote)
+            if not quotes:
+                return False
+
+            doc.append_to_section(HIGHLIGHTS_HEADING, quotes, before=HIGHLIGHTS_BEFORE)
+            self.syncer.write_note(file_path, doc.render())
+            self.syncer.manifest.record(filename, doc)
+            if self.syncer.search:
+                self.syncer.search.update(filename, doc)
+            self.syncer.touched_paths.add(file_path)
+            metrics.inc('highlights_appended_total', len(quotes))
+            print(f"✨ 新增 {len(quotes)} 条高亮: {filename}")
+            return True
+
+    def run(self) -> int:
+        """
+        同步新高亮并推进游标，返回更新的笔记数；请求失败时抛出 ApiError，游标不前进
+        """
+        with metrics.timer('stage_seconds', stage='highlights'):
+            highlights = self.fetch_new()
+            updated = self.apply(highlights)
+        for highlight in highlights:
+            key = (highlight.get('created', ''), str(highlight.get('_id', '')))
+            if key > (self.cursor.get('created', ''), self.cursor.get('last_id', '')):
+                self.cursor = {'created': key[0], 'last_id': key[1]}
+                self.dirty = True
+        if highlights:
+            print(f"✨ 高亮同步: {len(highlights)} 条新高亮, 更新 {updated} 个笔记")
+        return updated
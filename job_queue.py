@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+AI 任务队列
+同步新建的笔记登记为待处理任务，AI 步骤分批认领；每个任务记录状态、失败次数、下次重试时间和最后一次错误，
+失败后按指数退避重试，超过次数上限才放弃。队列保存在 vault 的 .sync/ai_jobs.sqlite 中（不随 vault 提交），
+GitHub Actions 中通过缓存在运行之间保留，每次 clone 后仍能继续上次剩下的任务。
+认领在 BEGIN IMMEDIATE 事务中完成，多个进程可以同时处理同一个队列；
+认领带租约，进程崩溃后租约过期的任务会被下一次运行重新认领。
+"""
+
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from metrics import metrics
+
+# 任务状态
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueue:
+    """
+    文件名 -> AI 任务
+    """
+    def __init__(self, db_path: Path, max_attempts: int = 6, base_delay: float = 600,
+                 max_delay: float = 86400, lease_seconds: float = 900):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        # 第 n 次失败后等待 base_delay * 2^(n-1) 秒（不超过 max_delay）再重试
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        # 尚未写入数据库的新任务：(文件名, 清单项, 登记时间)
+        self.pending = []
+        self.lock = threading.Lock()
+        # isolation_level=None：事务由这里显式控制（认领需要 BEGIN IMMEDIATE）
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                filename TEXT PRIMARY KEY,
+                raindrop_id TEXT,
+                created TEXT,
+                favorite INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_run_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                worker TEXT,
+                lease_until REAL,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, next_run_at);
+        """)
+
+    def add(self, filename: str, entry: dict = None, enqueued_at: float = None):
+        """
+        登记新任务（先缓存在内存中，save 时一次写入）
+        entry 为笔记清单项，提供 raindrop_id / created / favorite 用于排序；
+        enqueued_at 之后被认领 / 处理过的已有任务保持不变
+        """
+        with self.lock:
+            self.pending.append((filename, entry or {}, enqueued_at or time.time()))
+
+    def save(self):
+        """
+        写入登记的任务：新任务为 pending；已有任务在登记之后没有被处理过时重置为 pending（重新同步 / 手动补全）
+        """
+        with self.lock:
+            rows, self.pending = self.pending, []
+            if not rows:
+                return
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany("""
+                    INSERT INTO jobs (filename, raindrop_id, created, favorite, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (filename) DO UPDATE SET
+                        raindrop_id = excluded.raindrop_id, created = excluded.created,
+                        favorite = excluded.favorite,
+                        state = CASE WHEN jobs.updated_at < excluded.updated_at AND jobs.state != 'running'
+                                     THEN 'pending' ELSE jobs.state END,
+                        attempts = CASE WHEN jobs.updated_at < excluded.updated_at AND jobs.state != 'running'
+                                        THEN 0 ELSE jobs.attempts END,
+                        next_run_at = CASE WHEN jobs.updated_at < excluded.updated_at AND jobs.state != 'running'
+                                           THEN 0 ELSE jobs.next_run_at END
+                """, [(filename, str(entry.get('raindrop_id') or ''), entry.get('created') or filename[:10],
+                       int(bool(entry.get('favorite'))), enqueued_at) for filename, entry, enqueued_at in rows])
+                self.conn.execute('COMMIT')
+            except sqlite3.Error:
+                self.conn.execute('ROLLBACK')
+                raise
+        metrics.inc('ai_jobs_enqueued_total', len(rows))
+
+    def claim(self, limit: int) -> list:
+        """
+        认领至多 limit 个到期任务（收藏优先、最新优先），返回文件名列表
+        租约过期的 running 任务（上次运行中断）计一次失败后重新认领
+        """
+        now = time.time()
+        claimed = []
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.conn.execute("""
+                    SELECT filename, state, attempts FROM jobs
+                    WHERE (state = 'pending' AND next_run_at <= ?) OR (state = 'running' AND lease_until < ?)
+                    ORDER BY favorite DESC, created DESC, filename DESC LIMIT ?
+                """, (now, now, limit)).fetchall()
+                for filename, state, attempts in rows:
+                    if state == RUNNING:
+                        attempts += 1
+                        metrics.inc('ai_jobs_recovered_total')
+                        if attempts >= self.max_attempts:
+                            self.conn.execute("""
+                                UPDATE jobs SET state = 'failed', attempts = ?, last_error = ?, worker = NULL,
+                                    updated_at = ? WHERE filename = ?
+                            """, (attempts, '租约过期（运行中断）', now, filename))
+                            continue
+                    self.conn.execute("""
+                        UPDATE jobs SET state = 'running', attempts = ?, worker = ?, lease_until = ?, updated_at = ?
+                        WHERE filename = ?
+                    """, (attempts, self.worker, now + self.lease_seconds, now, filename))
+                    claimed.append(filename)
+                self.conn.execute('COMMIT')
+            except sqlite3.Error:
+                self.conn.execute('ROLLBACK')
+                raise
+        return claimed
+
+    def claim_one(self, filename: str) -> bool:
+        """
+        认领指定笔记（同一进程内刚同步完的笔记），任务还没写入时直接以 running 状态登记
+        已被其他进程认领或已完成时返回 False
+        """
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute("""
+                INSERT INTO jobs (filename, created, state, worker, lease_until, updated_at)
+                VALUES (?, ?, 'running', ?, ?, ?)
+                ON CONFLICT (filename) DO UPDATE SET
+                    state = 'running', worker = excluded.worker, lease_until = excluded.lease_until,
+                    updated_at = excluded.updated_at
+                WHERE jobs.state = 'pending' OR (jobs.state = 'running' AND jobs.lease_until < ?)
+            """, (filename, filename[:10], self.worker, now + self.lease_seconds, now, now))
+            return cursor.rowcount > 0
+
+    def iter_claimed(self, items, directory: Path, batch_size: int = 8, limit: int = 0, stop=None):
+        """
+        依次产出认领到的笔记：先是 items 中刚同步的笔记（文件路径或 (文件路径, NoteDocument)），
+        再分批认领队列中到期的任务（失败重试 / 上次剩下的）；stop() 为真或达到 limit 时不再认领
+        """
+        count = 0
+        for item in items:
+            file_path = item[0] if isinstance(item, tuple) else item
+            # 不再认领时继续读完 items（同步线程产生的笔记已登记在队列中，留给下次运行）
+            if (limit and count >= limit) or (stop and stop()):
+                continue
+            if self.claim_one(file_path.name):
+                count += 1
+                yield item
+        while not (stop and stop()) and not (limit and count >= limit):
+            size = min(batch_size, limit - count) if limit else batch_size
+            filenames = self.claim(size)
+            if not filenames:
+                return
+            for filename in filenames:
+                count += 1
+                yield directory / filename
+
+    def renew(self, filename: str):
+        """
+        延长租约（开始耗时较长的处理前调用）
+        """
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET lease_until = ? WHERE filename = ? AND worker = ?",
+                              (time.time() + self.lease_seconds, filename, self.worker))
+
+    def done(self, filename: str):
+        with self.lock:
+            self.conn.execute("""
+                UPDATE jobs SET state = 'done', last_error = NULL, worker = NULL, lease_until = NULL, updated_at = ?
+                WHERE filename = ?
+            """, (time.time(), filename))
+        metrics.inc('ai_jobs_total', outcome='done')
+
+    def fail(self, filename: str, error: str, retry: bool = True):
+        """
+        记录失败：未超过次数上限时按指数退避（带抖动）安排重试，否则标记为 failed
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT attempts FROM jobs WHERE filename = ?", (filename,)).fetchone()
+            if row is None:
+                return
+            attempts = row[0] + 1
+            if retry and attempts < self.max_attempts:
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                state, next_run_at = PENDING, now + delay
+            else:
+                state, next_run_at = FAILED, now
+            self.conn.execute("""
+                UPDATE jobs SET state = ?, attempts = ?, next_run_at = ?, last_error = ?,
+                    worker = NULL, lease_until = NULL, updated_at = ?
+                WHERE filename = ?
+            """, (state, attempts, next_run_at, error[:500], now, filename))
+        metrics.inc('ai_jobs_total', outcome='retry' if state == PENDING else 'failed')
+
+    def release_claimed(self) -> int:
+        """
+        本进程认领但没有处理的任务（时间预算用尽 / 熔断）放回队列，不计失败次数
+        """
+        with self.lock:
+            cursor = self.conn.execute("""
+                UPDATE jobs SET state = 'pending', worker = NULL, lease_until = NULL, updated_at = ?
+                WHERE state = 'running' AND worker = ?
+            """, (time.time(), self.worker))
+            return cursor.rowcount
+
+    def rename(self, old_filename: str, new_filename: str):
+        with self.lock:
+            self.pending = [(new_filename if filename == old_filename else filename, entry, enqueued_at)
+                            for filename, entry, enqueued_at in self.pending]
+            self.conn.execute("UPDATE OR REPLACE jobs SET filename = ? WHERE filename = ?",
+                              (new_filename, old_filename))
+
+    def counts(self) -> dict:
+        with self.lock:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def print_stats(self):
+        counts = self.counts()
+        print(f"📋 AI 任务队列: 待处理 {counts.get(PENDING, 0)}, 处理中 {counts.get(RUNNING, 0)}, "
+              f"已完成 {counts.get(DONE, 0)}, 已放弃 {counts.get(FAILED, 0)}")
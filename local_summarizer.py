@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+本地抽取式摘要
+不请求任何接口：把笔记中已有的 Raindrop 摘要、我的笔记和高亮切分成句子（兼顾中英文标点），
+按 TextRank 给句子打分，取分数最高的几句按原文顺序输出，毫秒级完成。
+生成的是临时摘要（带 provisional 标记），远程 AI 总结生成后会替换它。
+"""
+
+import math
+import re
+
+from local_tagger import tokenize
+from metrics import metrics
+from note_document import NoteDocument
+
+# 参与摘要的章节及初始权重：高亮和自己的笔记更能代表读者关心的内容
+SOURCE_SECTIONS = {'## 📝 摘要': 1.0, '## 💡 我的笔记': 1.5, '## ✨ 高亮标注': 2.0}
+# 句子数上限（TextRank 为 O(n²)）
+MAX_SOURCE_SENTENCES = 200
+DAMPING = 0.85
+
+# 句子：到中文句末标点（可带后引号 / 括号）、后面跟空白的英文句号，或行尾为止
+SENTENCE = re.compile(r'.+?(?:[。！？；!?…]+[”’」』）)"\']*|\.(?=\s)|$)')
+# 行首的引用 / 列表标记
+LINE_MARKER = re.compile(r'^\s*(?:>\s*|[-*+]\s+|\d+[.)]\s+)+')
+
+
+def split_sentences(text: str) -> list:
+    """
+    切分句子，去掉引用和列表标记、过短的句子
+    """
+    sentences = []
+    for line in text.splitlines():
+        line = LINE_MARKER.sub('', line).strip()
+        for sentence in SENTENCE.findall(line):
+            sentence = sentence.strip()
+            if len(sentence) >= 6:
+                sentences.append(sentence)
+    return sentences
+
+
+def similarity(a: set, b: set) -> float:
+    """
+    TextRank 句子相似度：公共词数 / (log|A| + log|B|)
+    """
+    common = len(a & b)
+    if not common:
+        return 0.0
+    return common / (math.log(len(a) + 1) + math.log(len(b) + 1))
+
+
+def textrank(token_sets: list, weights: list, iterations: int = 30, tolerance: float = 1e-4) -> list:
+    """
+    加权 PageRank（随机跳转按 weights 分布），返回每个句子的得分
+    与其他句子都不相似的句子（没有出边）保留自己的得分：否则它只剩 (1-d)·teleport，
+    就算均摊回随机跳转分布，大部分也会流向互相相似的句子，权重再高的高亮也排不到前面；
+    保留后它的得分收敛到自己的初始权重占比
+    """
+    n = len(token_sets)
+    edges = [[similarity(token_sets[i], token_sets[j]) if i != j else 0.0 for j in range(n)] for i in range(n)]
+    out_weight = [sum(row) for row in edges]
+    # 相似度矩阵对称：incoming[i] 为 (j, 归一化后的边权)，只保留非零边
+    incoming = [[(j, edges[j][i] / out_weight[j]) for j in range(n) if edges[j][i]] for i in range(n)]
+    total = sum(weights)
+    teleport = [weight / total for weight in weights]
+    scores = list(teleport)
+    for _ in range(iterations):
+        new_scores = [(1 - DAMPING) * teleport[i]
+                      + DAMPING * (sum(weight * scores[j] for j, weight in incoming[i]) if out_weight[i] else scores[i])
+                      for i in range(n)]
+        delta = sum(abs(new - old) for new, old in zip(new_scores, scores))
+        scores = new_scores
+        if delta < tolerance:
+            break
+    return scores
+
+
+def summarize(doc: NoteDocument, max_sentences: int = 5) -> str:
+    """
+    从笔记已有内容生成抽取式摘要（Markdown 列表），素材不足两句时返回空串
+    """
+    sentences = []
+    weights = []
+    seen = set()
+    for heading, weight in SOURCE_SECTIONS.items():
+        for sentence in split_sentences(doc.get_section(heading) or ''):
+            key = re.sub(r'\W+', '', sentence.lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            sentences.append(sentence)
+            weights.append(weight)
+    sentences, weights = sentences[:MAX_SOURCE_SENTENCES], weights[:MAX_SOURCE_SENTENCES]
+    if len(sentences) < 2:
+        return ''
+
+    token_sets = [set(tokenize(sentence)) for sentence in sentences]
+    scores = textrank(token_sets, weights)
+    # 约取 √n 句，按原文顺序输出
+    count = min(max_sentences, len(sentences), max(2, round(math.sqrt(len(sentences)))))
+    chosen = sorted(sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True)[:count])
+    metrics.inc('local_summaries_total')
+    return '\n'.join(f'- {sentences[i]}' for i in chosen)
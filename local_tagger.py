@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+本地标签建议
+以 vault 中已有笔记（Raindrop 标签 + 之前 AI 生成的标签）为训练数据，
+维护 词 -> 标签 的共现统计和 TF-IDF 权重，离线为新的总结推荐标签。
+统计保存在 .sync/local_tagger.json，按笔记增量更新。
+"""
+
+import hashlib
+import json
+import math
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+from note_document import NoteDocument
+
+# 每篇笔记只保留 TF-IDF 最高的若干个词参与共现统计，控制索引大小
+TOKENS_PER_NOTE = 40
+
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'that', 'this', 'from', 'are', 'was', 'you', 'your', 'http', 'https', 'www', 'com',
+    '一个', '我们', '他们', '这个', '那个', '以及', '进行', '可以', '没有', '什么', '如何', '通过', '因为', '所以',
+    '但是', '如果', '这些', '那些', '自己', '已经', '还是', '就是', '不是', '的是', '了一', '是一'
+}
+
+
+def tokenize(text: str) -> list:
+    """
+    分词：英文按单词，中文按相邻二字组（bigram）
+    """
+    tokens = []
+    for word in re.findall(r'[a-zA-Z][a-zA-Z0-9+#.\-]{1,}|[一-鿿]+', text.lower()):
+        if '一' <= word[0] <= '鿿':
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word.strip('.-'))
+    return [token for token in tokens if len(token) > 1 and token not in STOPWORDS]
+
+
+def note_text(doc: NoteDocument) -> str:
+    """
+    参与训练的笔记文本：标题 + 正文 + AI 总结
+    """
+    return '\n'.join([doc.get('title'), doc.body, doc.ai_block])
+
+
+class LocalTagger:
+    """
+    基于共现统计的本地标签建议器
+    """
+    VERSION = 1
+
+    def __init__(self, store_path: Path, min_notes: int = 50, confidence: float = 0.3, max_tags: int = 5):
+        self.store_path = Path(store_path)
+        self.min_notes = min_notes
+        self.confidence = confidence
+        self.max_tags = max_tags
+        self.lock = threading.Lock()
+        self.notes = {}
+        self.df = Counter()
+        self.cooc = {}
+        self.dirty = False
+        # 统计：本地给出标签的笔记数
+        self.local_count = 0
+        self.load()
+
+    def load(self):
+        if not self.store_path.exists():
+            return
+        try:
+            data = json.loads(self.store_path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ 读取本地标签索引失败，将重建: {e}")
+            return
+        if data.get('version') != self.VERSION:
+            return
+        self.notes = data.get('notes', {})
+        self.df = Counter(data.get('df', {}))
+        self.cooc = {token: Counter(tags) for token, tags in data.get('cooc', {}).items()}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {
+                'version': self.VERSION,
+                'notes': self.notes,
+                'df': self.df,
+                'cooc': self.cooc
+            }
+            self.store_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.store_path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+            tmp_path.replace(self.store_path)
+            self.dirty = False
+
+    def _idf(self, token: str) -> float:
+        return math.log((len(self.notes) + 1) / (self.df.get(token, 0) + 1)) + 1
+
+    def _top_tokens(self, text: str, limit: int) -> dict:
+        """
+        返回 TF-IDF 最高的 limit 个词及其权重
+        """
+        counts = Counter(tokenize(text))
+        weights = {token: count * self._idf(token) for token, count in counts.items()}
+        return dict(sorted(weights.items(), key=lambda kv: kv[1], reverse=True)[:limit])
+
+    def _remove(self, filename: str):
+        old = self.notes.pop(filename, None)
+        if not old:
+            return
+        for token in old['tokens']:
+            self.df[token] -= 1
+            if self.df[token] <= 0:
+                del self.df[token]
+            tags = self.cooc.get(token)
+            if tags is None:
+                continue
+            for tag in old['tags']:
+                tags[tag] -= 1
+                if tags[tag] <= 0:
+                    del tags[tag]
+            if not tags:
+                del self.cooc[token]
+
+    def add(self, filename: str, doc: NoteDocument):
+        """
+        把一篇已打标签的笔记加入索引（内容未变化时跳过）
+        """
+        tags = doc.tags
+        text = note_text(doc)
+        digest = hashlib.sha1((text + '\0' + '\0'.join(tags)).encode('utf-8')).hexdigest()
+        with self.lock:
+            if self.notes.get(filename, {}).get('hash') == digest:
+                return
+            self._remove(filename)
+            self.dirty = True
+            if not tags:
+                # 无标签的笔记只记录哈希，避免每次刷新重复读取
+                self.notes[filename] = {'hash': digest, 'tokens': [], 'tags': []}
+                return
+            tokens = list(self._top_tokens(text, TOKENS_PER_NOTE))
+            self.notes[filename] = {'hash': digest, 'tokens': tokens, 'tags': tags}
+            for token in tokens:
+                self.df[token] += 1
+                self.cooc.setdefault(token, Counter()).update(tags)
+
+    def refresh(self, notes_dir: Path, manifest):
+        """
+        根据笔记清单增量更新索引：只读取新增或大小变化的笔记
+        """
+        notes_dir = Path(notes_dir)
+        with self.lock:
+            known = {filename: note.get('size') for filename, note in self.notes.items()}
+        # 同步线程可能同时在登记笔记，在清单的锁内取快照后再遍历
+        with manifest.lock:
+            entries = {filename: dict(entry) for filename, entry in manifest.entries.items()}
+        changed = [filename for filename, entry in entries.items() if known.get(filename) != entry.get('size')]
+        for filename in changed:
+            try:
+                self.add(filename, NoteDocument.from_file(notes_dir / filename))
+            except OSError:
+                continue
+            with self.lock:
+                if filename in self.notes:
+                    self.notes[filename]['size'] = entries[filename].get('size')
+        with self.lock:
+            removed = [filename for filename in self.notes if filename not in entries]
+            for filename in removed:
+                self._remove(filename)
+                self.dirty = True
+        if changed or removed:
+            print(f"🧠 本地标签索引: 更新 {len(changed)} 篇, 移除 {len(removed)} 篇, 共 {len(self.notes)} 篇")
+
+    def suggest(self, text: str) -> tuple:
+        """
+        为文本推荐标签，返回 (tags, confidence)
+        score(tag) = Σ w(t) · P(tag | t) / Σ w(t)，confidence 为入选标签的平均得分
+        """
+        with self.lock:
+            if len(self.notes) < self.min_notes:
+                return [], 0.0
+            weights = self._top_tokens(text, TOKENS_PER_NOTE)
+            total = sum(weights.values())
+            if not total:
+                return [], 0.0
+            scores = Counter()
+            for token, weight in weights.items():
+                tags = self.cooc.get(token)
+                if not tags:
+                    continue
+                df = self.df[token]
+                for tag, count in tags.items():
+                    scores[tag] += weight * count / df
+        ranked = [(tag, score / total) for tag, score in scores.most_common(self.max_tags)]
+        selected = [(tag, score) for tag, score in ranked if score >= self.confidence / 2]
+        if not selected:
+            return [], 0.0
+        return [tag for tag, _ in selected], sum(score for _, score in selected) / len(selected)
+
+    def tag(self, text: str) -> list:
+        """
+        置信度足够时返回本地标签，否则返回 None（交给远程 AI 标签）
+        """
+        tags, confidence = self.suggest(text)
+        if tags and confidence >= self.confidence:
+            with self.lock:
+                self.local_count += 1
+            return tags
+        return None
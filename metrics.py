@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+运行指标
+同步和 AI 步骤共用的计数器 / 耗时直方图 / 字节数，运行结束时写出 JSON 运行报告和
+Prometheus textfile 格式文件（可交给 node_exporter 的 textfile collector 采集）。
+可选 --profile：对热点路径做 cProfile + tracemalloc 快照。
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# 耗时直方图的桶上限（秒），覆盖单次渲染到整条总结流
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    """
+    累积桶直方图
+    """
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        """
+        按桶估算分位数（返回所在桶的上限）
+        """
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 4),
+            'avg': round(self.sum / self.count, 4) if self.count else 0,
+            'p50': self.quantile(0.5) if self.count else 0,
+            'p95': self.quantile(0.95) if self.count else 0,
+            'max': round(self.max, 4)
+        }
+
+
+class Metrics:
+    """
+    线程安全的指标注册表
+    指标以 (名称, 标签) 为键，例如 inc('api_requests_total', api='raindrop', status='200')
+    """
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+
+    @staticmethod
+    def key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        记录代码块耗时，出错时同样记录
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def value(self, name: str, **labels) -> float:
+        with self.lock:
+            return self.counters.get(self.key(name, labels), 0)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started_at = time.time()
+
+    def report(self) -> dict:
+        """
+        JSON 运行报告
+        """
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{'name': name, 'labels': dict(labels), **histogram.summary()}
+                          for (name, labels), histogram in sorted(self.histograms.items())]
+        return {
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'duration_seconds': round(time.time() - self.started_at, 3),
+            'counters': counters,
+            'histograms': histograms
+        }
+
+    def prometheus(self, prefix: str = 'raindrop_') -> str:
+        """
+        Prometheus textfile 格式
+        """
+        def render_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+            return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+        lines = []
+        typed = set()
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {prefix}{name} counter')
+                    typed.add(name)
+                lines.append(f'{prefix}{name}{render_labels(labels)} {value}')
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {prefix}{name} histogram')
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}{name}_bucket{render_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{prefix}{name}_bucket{render_labels(labels, [("le", "+Inf")])} {histogram.count}')
+                lines.append(f'{prefix}{name}_sum{render_labels(labels)} {histogram.sum:.6f}')
+                lines.append(f'{prefix}{name}_count{render_labels(labels)} {histogram.count}')
+
+        lines.append(f'# TYPE {prefix}last_run_timestamp_seconds gauge')
+        lines.append(f'{prefix}last_run_timestamp_seconds {int(time.time())}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, name: str, output_dir: Path = None):
+        """
+        写出 <name>_report.json 和 <name>.prom
+        目录默认为 METRICS_DIR，其次 GITHUB_WORKSPACE（不写进 vault）
+        """
+        output_dir = Path(output_dir or metrics_dir())
+        try:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            report_path = output_dir / f'{name}_report.json'
+            report_path.write_text(json.dumps(self.report(), ensure_ascii=False, indent=2), encoding='utf-8')
+            # 先写临时文件再替换，避免采集端读到半个文件
+            prom_path = output_dir / f'{name}.prom'
+            tmp_path = prom_path.with_suffix('.prom.tmp')
+            tmp_path.write_text(self.prometheus(), encoding='utf-8')
+            os.replace(tmp_path, prom_path)
+            print(f"📈 运行报告: {report_path}, 指标: {prom_path}")
+        except OSError as e:
+            print(f"⚠️ 写入运行指标失败: {e}")
+
+
+def metrics_dir() -> Path:
+    return Path(os.getenv('METRICS_DIR') or os.getenv('GITHUB_WORKSPACE', '.'))
+
+
+@contextmanager
+def profile(name: str, enabled: bool = True, output_dir: Path = None, top: int = 30):
+    """
+    cProfile + tracemalloc 快照，写出 <name>.prof（可用 snakeviz / pstats 查看）和
+    <name>_profile.txt（耗时最多的函数和分配内存最多的代码行）
+    cProfile 只剖析调用它的线程，剖析期间新建的线程（流水线各阶段的 worker、同步线程）各自启动一个剖析器，
+    结束时合并到同一份结果中
+    """
+    if not enabled:
+        yield
+        return
+
+    output_dir = Path(output_dir or metrics_dir())
+    profiler = cProfile.Profile()
+    thread_profilers = []
+    lock = threading.Lock()
+
+    def start_thread_profiler(*args):
+        thread_profiler = cProfile.Profile()
+        try:
+            # 替换掉当前线程的这个钩子
+            thread_profiler.enable()
+        except ValueError:
+            # Python 3.12+ 的 cProfile 基于 sys.monitoring，主线程的剖析器已覆盖所有线程
+            sys.setprofile(None)
+            return
+        with lock:
+            thread_profilers.append(thread_profiler)
+
+    tracemalloc.start(10)
+    threading.setprofile(start_thread_profiler)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        threading.setprofile(None)
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        try:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            prof_path = output_dir / f'{name}.prof'
+            stats = pstats.Stats(profiler)
+            with lock:
+                for thread_profiler in thread_profilers:
+                    # 仍在运行的线程（如常驻模式的后台线程）到此为止的数据
+                    thread_profiler.create_stats()
+                    if thread_profiler.stats:
+                        stats.add(thread_profiler)
+            stats.dump_stats(prof_path)
+            text_path = output_dir / f'{name}_profile.txt'
+            with open(text_path, 'w', encoding='utf-8') as f:
+                stats.stream = f
+                f.write(f"# 剖析线程数: {1 + len(thread_profilers)}\n")
+                stats.sort_stats('cumulative').print_stats(top)
+                f.write(f"\n# tracemalloc: current {current / 1024 / 1024:.1f} MB, peak {peak / 1024 / 1024:.1f} MB\n")
+                for stat in snapshot.statistics('lineno')[:top]:
+                    f.write(f"{stat}\n")
+            print(f"🔬 性能剖析: {prof_path}, {text_path}")
+        except OSError as e:
+            print(f"⚠️ 写入性能剖析失败: {e}")
+
+
+# 进程内共享的默认注册表
+metrics = Metrics()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Raindrop 笔记文档模型
+一次解析出 FrontMatter、正文各 "## " 章节和 AI 总结块，修改后一次写回。
+对本项目生成的笔记，parse -> render 的结果与原文完全一致。
+"""
+
+import re
+import threading
+from pathlib import Path
+
+AI_SUMMARY_HEADING = '## 🤖 AI 深度总结'
+# 同一进程中同步线程（原地更新、重复收藏链接、高亮）和 AI 流水线（总结、标签）都会读改写笔记，
+# 从读取到写回的整个过程持有此锁，避免一方用旧内容覆盖另一方的改动
+NOTE_WRITE_LOCK = threading.RLock()
+# 本地抽取的临时摘要的标记，远程 AI 总结生成后整块替换
+PROVISIONAL_MARKER = '<!-- provisional-summary -->'
+
+
+def parse_flow_list(value: str) -> list:
+    """
+    解析 YAML 行内列表 [a, "b", 'c']，返回去掉引号的各项
+    """
+    inner = value[1:-1]
+    items = re.findall(r'\s*("[^"]*"|\'[^\']*\'|[^,]*?)\s*(?:,|$)', inner)
+    return [item[1:-1] if item[:1] in ('"', "'") else item for item in items if item]
+
+
+class NoteDocument:
+    """
+    笔记文档
+    frontmatter: [key, value, items, raw] 列表，items 不为 None 时表示 YAML 列表（如 tags）；
+                 raw 为原始文本，字段未修改时原样输出；无法识别的行以 [None, 原始行, None, 原始行] 保存
+    preamble:    第一个 "## " 章节之前的正文
+    sections:    [标题行, 章节内容] 列表
+    ai_block:    从 AI 总结标题到文件末尾的原文（其中可能包含任意子标题）
+    """
+    def __init__(self):
+        self.has_frontmatter = False
+        self.frontmatter = []
+        self.preamble = ''
+        self.sections = []
+        self.ai_block = ''
+
+    @classmethod
+    def from_file(cls, file_path: Path) -> 'NoteDocument':
+        return cls.parse(Path(file_path).read_text(encoding='utf-8'))
+
+    @classmethod
+    def parse(cls, text: str) -> 'NoteDocument':
+        doc = cls()
+        body = text
+
+        # FrontMatter
+        if text.startswith('---\n'):
+            end = text.find('\n---', 3)
+            if end != -1:
+                doc.has_frontmatter = True
+                doc._parse_frontmatter(text[4:end])
+                body = text[end + 4:]
+                if body.startswith('\n'):
+                    body = body[1:]
+
+        # AI 总结块位于末尾，其中的 "## " 不再作为章节拆分
+        match = re.search(rf'^{re.escape(AI_SUMMARY_HEADING)}', body, re.MULTILINE)
+        if match:
+            doc.ai_block = body[match.start():]
+            body = body[:match.start()]
+
+        # 按 "## " 拆分章节
+        current = None
+        preamble = []
+        for line in body.splitlines(keepends=True):
+            if line.startswith('## '):
+                current = [line.rstrip('\n'), '']
+                doc.sections.append(current)
+            elif current is None:
+                preamble.append(line)
+            else:
+                current[1] += line
+        doc.preamble = ''.join(preamble)
+        return doc
+
+    def _parse_frontmatter(self, text: str):
+        current = None
+        for line in text.split('\n'):
+            item = re.match(r'^\s*- (.*)$', line)
+            if item and current is not None and current[2] is not None:
+                current[2].append(item.group(1).strip())
+                current[3] += '\n' + line
+                continue
+            field = re.match(r'^(\w+):(?:\s(.*))?$', line)
+            if field:
+                value = (field.group(2) or '').strip()
+                if value.startswith('[') and value.endswith(']'):
+                    # 手动编辑的笔记中的行内列表 tags: [a, b]
+                    current = [field.group(1), value, parse_flow_list(value), line]
+                elif field.group(1) == 'tags' and value and not value.startswith(('{', '|', '>', '&', '*', '!')):
+                    # 只有一个标签时的标量写法 tags: a
+                    current = [field.group(1), value, [value.strip('"\'')], line]
+                elif value:
+                    current = [field.group(1), value, None, line]
+                else:
+                    current = [field.group(1), '', [], line]
+                self.frontmatter.append(current)
+                continue
+            current = None
+            self.frontmatter.append([None, line, None, line])
+
+    # ---------- FrontMatter ----------
+
+    def _field(self, key: str):
+        for entry in self.frontmatter:
+            if entry[0] == key:
+                return entry
+        return None
+
+    def get(self, key: str, default: str = '') -> str:
+        """
+        读取 FrontMatter 标量字段（去掉引号）
+        """
+        entry = self._field(key)
+        if entry is None or entry[2] is not None:
+            return default
+        return entry[1].strip('"')
+
+    def set(self, key: str, value):
+        """
+        设置 FrontMatter 字段，value 为 list 时写成 YAML 列表
+        """
+        if not self.has_frontmatter:
+            # 新建 FrontMatter 时与正文之间空一行
+            self.has_frontmatter = True
+            self.preamble = '\n' + self.preamble
+        entry = self._field(key)
+        if entry is None:
+            entry = [key, '', None, None]
+            self.frontmatter.append(entry)
+        if isinstance(value, list):
+            entry[1], entry[2] = '', list(value)
+        else:
+            entry[1], entry[2] = str(value), None
+        entry[3] = None
+
+    @property
+    def url(self) -> str:
+        url = self.get('url')
+        if url:
+            return url
+        # 尝试从正文提取 🔗 [url](https://...)
+        match = re.search(r'🔗 \[(.*?)\]\((http.*?)\)', self.preamble)
+        return match.group(2).strip() if match else ''
+
+    @property
+    def raindrop_id(self) -> str:
+        return self.get('raindrop_id')
+
+    @property
+    def tags(self) -> list:
+        entry = self._field('tags')
+        return list(entry[2]) if entry and entry[2] is not None else []
+
+    def add_tags(self, tags: list):
+        """
+        把新标签插入到已有标签之前（与 AI 标签注入的既有顺序一致），已存在的标签不重复添加
+        """
+        entry = self._field('tags')
+        if entry is not None and entry[2] is None:
+            # 无法识别的 tags 写法原样保留，不覆盖用户已有的标签
+            return
+        existing = self.tags
+        new_tags = [tag for tag in tags if tag not in existing]
+        if new_tags:
+            self.set('tags', new_tags + existing)
+
+    # ---------- 正文 ----------
+
+    @property
+    def has_summary(self) -> bool:
+        """
+        是否已有远程 AI 总结（本地临时摘要不算）
+        """
+        return bool(self.ai_block) and not self.provisional
+
+    @property
+    def provisional(self) -> bool:
+        return PROVISIONAL_MARKER in self.ai_block
+
+    def get_section(self, heading: str) -> str:
+        for section in self.sections:
+            if section[0] == heading:
+                return section[1]
+        return None
+
+    def set_section(self, heading: str, text: str, before: str = None):
+        """
+        设置章节内容，不存在时插入到 before 章节之前（否则追加到末尾）
+        """
+        for section in self.sections:
+            if section[0] == heading:
+                section[1] = text
+                return
+        new_section = [heading, text]
+        for index, section in enumerate(self.sections):
+            if section[0] == before:
+                self.sections.insert(index, new_section)
+                return
+        self.sections.append(new_section)
+
+    def append_to_section(self, heading: str, paragraphs: list, before: str = None):
+        """
+        在章节末尾追加段落（段落之间空一行），已有内容原样保留；
+        章节不存在时新建，插入到 before 章节之前（否则追加到正文末尾）
+        """
+        block = '\n\n'.join(paragraphs)
+        existing = self.get_section(heading)
+        if existing is not None:
+            base = existing.rstrip('\n')
+            trailing = existing[len(base):] or '\n'
+            self.set_section(heading, base + ('\n\n' if base else '\n') + block + trailing)
+            return
+
+        if any(section[0] == before for section in self.sections):
+            self.set_section(heading, f'\n{block}\n\n', before)
+            return
+        # 追加为最后一个章节：原末尾的换行（如与 AI 总结块之间的空行）移到新章节之后
+        if self.sections:
+            previous = self.sections[-1][1]
+            self.sections[-1][1] = previous.rstrip('\n') + '\n\n'
+        else:
+            previous = self.preamble
+            self.preamble = previous.rstrip('\n') + '\n\n'
+        trailing = previous[len(previous.rstrip('\n')):] or '\n'
+        self.sections.append([heading, f'\n{block}{trailing}'])
+
+    @property
+    def body(self) -> str:
+        return self.preamble + ''.join(f'{heading}\n{text}' for heading, text in self.sections)
+
+    def set_ai_block(self, block: str):
+        """
+        设置 AI 总结块（以 AI 总结标题开头），与正文之间空两行
+        """
+        if not block:
+            self.ai_block = ''
+            return
+        if self.sections:
+            self.sections[-1][1] = self.sections[-1][1].rstrip('\n') + '\n\n\n'
+        else:
+            self.preamble = self.preamble.rstrip('\n') + '\n\n\n'
+        self.ai_block = block
+
+    def set_summary(self, title: str, content: str, provisional: bool = False):
+        """
+        写入 AI 总结；provisional 为本地抽取的临时摘要
+        """
+        block = f"{AI_SUMMARY_HEADING}\n\n"
+        if provisional:
+            block += f"{PROVISIONAL_MARKER}\n> 📎 本地抽取的临时摘要，远程 AI 总结生成后会自动替换\n\n"
+        if title:
+            block += f"**{title}**\n\n"
+        block += f"{content}\n"
+        self.set_ai_block(block)
+
+    # ---------- 序列化 ----------
+
+    def render_frontmatter(self) -> str:
+        lines = []
+        for key, value, items, raw in self.frontmatter:
+            if raw is not None:
+                lines.append(raw)
+            elif items is None:
+                lines.append(f'{key}: {value}')
+            elif not items and value == '[]':
+                lines.append(f'{key}: []')
+            else:
+                lines.append(f'{key}:')
+                lines.extend(f'  - {item}' for item in items)
+        return '---\n' + ''.join(f'{line}\n' for line in lines) + '---\n'
+
+    def render(self) -> str:
+        text = self.body + self.ai_block
+        if self.has_frontmatter:
+            return self.render_frontmatter() + text
+        return text
+
+    def save(self, file_path: Path):
+        Path(file_path).write_text(self.render(), encoding='utf-8')
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Raindrop 笔记索引
+维护 raindrop _id -> 笔记文件路径 / 内容哈希 / lastUpdate 的映射，保存为 vault 中的 JSON 清单。
+"""
+
+import json
+import re
+from pathlib import Path
+
+
+class NoteIndex:
+    """
+    raindrop _id -> 笔记 的持久化索引
+    索引文件丢失时会根据笔记 FrontMatter 中的 raindrop_id 重建一次
+    """
+    VERSION = 1
+
+    def __init__(self, notes_dir: Path, index_path: Path):
+        self.notes_dir = Path(notes_dir)
+        self.index_path = Path(index_path)
+        self.notes = {}
+        # 没有 raindrop_id 的旧笔记：url -> 文件名，首次遇到对应书签时认领
+        self.legacy = {}
+        self.paths = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """
+        读取索引，不存在或损坏时从 FrontMatter 重建
+        """
+        if self.index_path.exists():
+            try:
+                data = json.loads(self.index_path.read_text(encoding='utf-8'))
+                if data.get('version') == self.VERSION:
+                    self.notes = data.get('notes', {})
+                    self.legacy = data.get('legacy', {})
+                    self.paths = {entry['path']: raindrop_id for raindrop_id, entry in self.notes.items()}
+                    return
+            except (OSError, json.JSONDecodeError, KeyError) as e:
+                print(f"⚠️ 读取笔记索引失败，将重建: {e}")
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        扫描笔记目录，从 FrontMatter 重建索引
+        """
+        print(f"🔨 正在重建笔记索引: {self.notes_dir}")
+        self.notes = {}
+        self.legacy = {}
+        self.paths = {}
+
+        for file_path in self.notes_dir.glob('*.md'):
+            try:
+                frontmatter = read_frontmatter(file_path)
+            except OSError as e:
+                print(f"   ⚠️ 读取文件失败 ({file_path.name}): {e}")
+                continue
+
+            raindrop_id = frontmatter.get('raindrop_id')
+            if raindrop_id:
+                self.set(raindrop_id, file_path.name)
+            elif frontmatter.get('url'):
+                self.legacy[frontmatter['url']] = file_path.name
+
+        self.dirty = True
+        print(f"   索引 {len(self.notes)} 个笔记，{len(self.legacy)} 个旧笔记待认领")
+
+    def get(self, raindrop_id) -> dict:
+        return self.notes.get(str(raindrop_id))
+
+    def owner(self, path: str) -> str:
+        """
+        返回占用该文件名的 raindrop _id（旧笔记返回空串，未占用返回 None）
+        """
+        if path in self.paths:
+            return self.paths[path]
+        if path in self.legacy.values():
+            return ''
+        return None
+
+    def claim_legacy(self, url: str) -> str:
+        """
+        认领与 url 对应的旧笔记，返回文件名
+        """
+        path = self.legacy.pop(url, None)
+        if path:
+            self.dirty = True
+        return path
+
+    def set(self, raindrop_id, path: str, content_hash: str = '', last_update: str = '', tags: list = None):
+        """
+        新增或更新索引项（路径变化时同步更新反向映射）
+        tags 记录 Raindrop 自身的标签，用于区分 AI 注入的标签
+        """
+        raindrop_id = str(raindrop_id)
+        old = self.notes.get(raindrop_id) or {}
+        if old and self.paths.get(old['path']) == raindrop_id:
+            del self.paths[old['path']]
+        entry = {
+            'path': path,
+            'hash': content_hash or old.get('hash', ''),
+            'last_update': last_update or old.get('last_update', '')
+        }
+        if tags is not None:
+            entry['tags'] = list(tags)
+        elif 'tags' in old:
+            entry['tags'] = old['tags']
+        self.notes[raindrop_id] = entry
+        self.paths[path] = raindrop_id
+        self.dirty = True
+
+    def save(self):
+        """
+        原子写入索引文件（无变化时不写，避免产生 git 变更）
+        """
+        if not self.dirty:
+            return
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {'version': self.VERSION, 'notes': self.notes, 'legacy': self.legacy}
+        tmp_path = self.index_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True), encoding='utf-8')
+        tmp_path.replace(self.index_path)
+        self.dirty = False
+
+
+def read_frontmatter(file_path: Path) -> dict:
+    """
+    读取 FrontMatter 中的简单 key: value 字段（只读取文件头部）
+    """
+    fields = {}
+    with open(file_path, 'r', encoding='utf-8') as f:
+        if f.readline().strip() != '---':
+            return fields
+        for line in f:
+            if line.strip() == '---':
+                break
+            match = re.match(r'^(\w+):\s*(.*)$', line.rstrip('\n'))
+            if match and match.group(2):
+                fields[match.group(1)] = match.group(2).strip().strip('"')
+    return fields
+
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+多阶段流水线
+每个阶段有独立的线程数和有界输入队列，前一阶段的输出直接进入下一阶段，
+使不同后端（如 Dedao 总结、GLM 标签）的请求可以互相重叠。
+"""
+
+import queue
+import threading
+import time
+
+from metrics import metrics
+
+_STOP = object()
+
+
+class Stage:
+    """
+    流水线阶段
+    func 接收一个条目，返回传给下一阶段的条目；返回 None 表示丢弃
+    batch=True（或 batch_size > 1）时 func 接收条目列表并返回结果列表（其中的 None 同样表示丢弃），
+    worker 会在 batch_wait 秒内尽量凑满一批；batch_size 为 1 时仍传入只有一个条目的列表
+    on_error(item, error) 在 func 抛出异常时对每个条目调用一次（如记入任务队列的失败次数）
+    """
+    def __init__(self, name: str, func, workers: int = 1, maxsize: int = 0,
+                 batch_size: int = 1, batch_wait: float = 0.0, batch: bool = False, on_error=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch = batch or self.batch_size > 1
+        self.batch_wait = batch_wait
+        self.on_error = on_error
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        # 统计
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+        self.depth_samples = 0
+        self.depth_total = 0
+
+    def put(self, item):
+        self.queue.put(item)
+        depth = self.queue.qsize()
+        with self.lock:
+            self.max_depth = max(self.max_depth, depth)
+            self.depth_samples += 1
+            self.depth_total += depth
+
+    def record(self, elapsed: float, result, error: bool = False):
+        with self.lock:
+            self.busy_seconds += elapsed
+            if error:
+                self.errors += 1
+                outcome = 'error'
+            elif result is None:
+                self.dropped += 1
+                outcome = 'dropped'
+            else:
+                self.processed += 1
+                outcome = 'processed'
+        metrics.observe('stage_seconds', elapsed, stage=self.name)
+        metrics.inc('stage_items_total', stage=self.name, outcome=outcome)
+
+    def fail(self, items: list, error: Exception):
+        if not self.on_error:
+            return
+        for item in items:
+            try:
+                self.on_error(item, error)
+            except Exception as e:
+                print(f"   ❌ 阶段 {self.name} 记录失败出错: {e}")
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'busy_seconds': round(self.busy_seconds, 3),
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_depth,
+                'avg_queue_depth': round(self.depth_total / self.depth_samples, 2) if self.depth_samples else 0
+            }
+
+
+class Pipeline:
+    """
+    由多个 Stage 串联成的流水线
+    collect=False 时不保留最后一个阶段的输出（长时间运行的导出任务内存不随条目数增长）
+    """
+    def __init__(self, stages: list, collect: bool = True):
+        self.stages = stages
+        self.collect = collect
+        self.results = []
+        self.results_lock = threading.Lock()
+
+    def _next_batch(self, stage: Stage) -> tuple:
+        """
+        取出一批条目，返回 (条目列表, 是否已收到结束信号)
+        """
+        item = stage.queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + stage.batch_wait
+        while len(batch) < stage.batch_size:
+            try:
+                item = stage.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _emit(self, next_stage: Stage, result):
+        if next_stage:
+            next_stage.put(result)
+        elif self.collect:
+            with self.results_lock:
+                self.results.append(result)
+
+    def _worker(self, index: int, done: threading.Barrier):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            if stage.batch:
+                batch, stopped = self._next_batch(stage)
+                if batch:
+                    start = time.monotonic()
+                    try:
+                        results = stage.func(batch)
+                    except Exception as e:
+                        print(f"   ❌ 阶段 {stage.name} 处理出错: {e}")
+                        stage.fail(batch, e)
+                        results = [None] * len(batch)
+                        errors = True
+                    else:
+                        errors = False
+                    elapsed = (time.monotonic() - start) / len(batch)
+                    for result in results:
+                        stage.record(elapsed, result, error=errors)
+                        if result is not None:
+                            self._emit(next_stage, result)
+                if stopped:
+                    break
+                continue
+
+            item = stage.queue.get()
+            if item is _STOP:
+                break
+
+            start = time.monotonic()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                print(f"   ❌ 阶段 {stage.name} 处理出错: {e}")
+                stage.fail([item], e)
+                stage.record(time.monotonic() - start, None, error=True)
+                continue
+            stage.record(time.monotonic() - start, result)
+
+            if result is not None:
+                self._emit(next_stage, result)
+
+        # 本阶段最后一个退出的线程负责通知下一阶段结束
+        if done.wait() == 0 and next_stage:
+            for _ in range(next_stage.workers):
+                next_stage.queue.put(_STOP)
+
+    def run(self, items) -> list:
+        """
+        运行流水线，返回最后一个阶段的输出
+        """
+        threads = []
+        for index, stage in enumerate(self.stages):
+            done = threading.Barrier(stage.workers)
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(index, done),
+                                          name=f"{stage.name}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        first = self.stages[0]
+        for item in items:
+            first.put(item)
+        for _ in range(first.workers):
+            first.queue.put(_STOP)
+
+        for thread in threads:
+            thread.join()
+        return self.results
+
+    def stats(self) -> dict:
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def print_stats(self):
+        """
+        打印各阶段统计，忙碌时间最长 / 队列最深的阶段即为瓶颈
+        """
+        print("📈 流水线阶段统计:")
+        for name, stat in self.stats().items():
+            print(f"   - {name}: 完成 {stat['processed']}, 丢弃 {stat['dropped']}, 出错 {stat['errors']}, "
+                  f"忙碌 {stat['busy_seconds']}s, 队列峰值 {stat['max_queue_depth']}, "
+                  f"平均队列 {stat['avg_queue_depth']} ({stat['workers']} 线程)")
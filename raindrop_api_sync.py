@@ -4,14 +4,43 @@ Raindrop.io API 同步脚本
 通过 API 获取最新的书签并转换为 Obsidian Markdown
 """
 
+import argparse
 import os
 import sys
 import json
-import requests
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import hashlib
 import re
+import sqlite3
+import time
+
+from api_client import ApiError, RaindropClient
+from collection_cache import CollectionCache
+from dedup_index import DedupIndex
+from highlight_sync import HighlightSync
+from job_queue import JobQueue
+from metrics import metrics, profile
+from note_document import NOTE_WRITE_LOCK, NoteDocument
+from note_index import NoteIndex, read_frontmatter
+from pipeline import Pipeline, Stage
+from search_index import SearchIndex
+from vault_manifest import VaultManifest
+
+# 重复收藏的链接登记在保留笔记的这个章节中
+DUPLICATES_HEADING = '## 🔁 重复收藏'
+# 标题 / 摘要指纹相近的已有笔记，交叉链接到新笔记的这个章节
+SIMILAR_HEADING = '## 🔗 相似收藏'
+# 同一书签（lastUpdate 不变）连续处理失败这么多次后跳过，游标不再停在它之前
+SYNC_MAX_ATTEMPTS = 5
+# 随 vault 提交的同步状态：小的 JSON 文件，clone 后即可继续增量同步
+COMMITTED_STATE = ('.gitignore', 'cursor.json', 'export_checkpoint.json', 'index.json', 'manifest.json',
+                   'dedup.json', 'collections.json', 'highlights.json')
+# 不提交的本地状态：SQLite 数据库（AI 任务队列 / AI 缓存）、本地标签模型和部分总结，
+# 在 GitHub Actions 中由缓存在运行之间保留；丢失时可以重建（--backfill 补全任务，标签模型从笔记重新训练）
+LOCAL_STATE = ('*.sqlite*', '*.tmp', 'local_tagger.json', 'partial/')
 
 
 class RaindropSync:
@@ -19,19 +48,156 @@ class RaindropSync:
     Raindrop API 同步器
     """
     
-    def __init__(self, api_token: str, output_dir: str = '30_Resources'):
+    def __init__(self, api_token: str, output_dir: str = '30_Resources', update_existing: bool = True,
+                 client: RaindropClient = None, shard_workers: int = 0, sync_highlights: bool = True):
         self.api_token = api_token
         self.base_url = 'https://api.raindrop.io/rest/v1'
-        self.headers = {
-            'Authorization': f'Bearer {api_token}',
-            'Content-Type': 'application/json'
-        }
+        self.client = client or RaindropClient(api_token, self.base_url)
         self.output_dir = Path(output_dir) / 'Raindrop'
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
+        # 同步状态（游标等）随 vault 一起提交，保证每次 clone 后仍可增量同步
+        self.state_dir = self.output_dir / '.sync'
+        self.cursor_path = self.state_dir / 'cursor.json'
+        # 全量导出的断点（已完整写入的页码和该页最后一个 _id）
+        self.checkpoint_path = self.state_dir / 'export_checkpoint.json'
+        self.cursor = self.load_cursor()
+        # 本次同步中处理出错的最早书签：id(游标) -> (游标, (lastUpdate, _id))，保存游标时游标退回到它之前
+        self.cursor_holds = {}
+        self.index = NoteIndex(self.output_dir, self.state_dir / 'index.json')
+        self.manifest = VaultManifest(self.output_dir, self.state_dir / 'manifest.json')
+        # 规范化 URL / SimHash 指纹去重索引
+        self.dedup = DedupIndex(self.state_dir / 'dedup.json')
+        if not self.dedup.index_path.exists():
+            self.dedup.rebuild(self.manifest.entries)
+        # 收藏夹 $id -> 嵌套路径，过期（默认 24 小时）或遇到新收藏夹时才重新获取
+        self.collections = CollectionCache(self.client, self.state_dir / 'collections.json')
+        # 大于 0 时按收藏夹分片并行同步，每个分片独立游标
+        self.shard_workers = shard_workers
+        # 新笔记登记为 AI 任务，失败后按退避时间重试（取代 new_files_list.txt）
+        self.jobs = JobQueue(self.state_dir / 'ai_jobs.sqlite')
+        # 通过 /highlights 列表增量追加新高亮
+        self.highlights = HighlightSync(self, self.state_dir / 'highlights.json') if sync_highlights else None
+        # 全文搜索索引（已用 search_index.py 建立时）随笔记写入增量更新
+        self.search = SearchIndex.open(self.output_dir)
+        self.ignore_local_state()
+        
+        # 是否对已存在且有变更的书签做原地更新
+        self.update_existing = update_existing
+        
         self.created_files = []
+        self.updated_files = []
+        self.reset_counts()
+        # 本次同步改动过的文件（含重命名前的旧路径），供只暂存改动路径的 git 提交使用
+        self.touched_paths = set()
+        
+        # 新笔记写入后的回调 (filename, NoteDocument)，用于在同一进程中直接交给 AI 流水线
+        self.on_note_created = None
     
-
+    def ignore_local_state(self):
+        """
+        在 .sync/.gitignore 中忽略本地状态，手动 git add 时也不会提交
+        """
+        ignore_path = self.state_dir / '.gitignore'
+        content = '\n'.join(LOCAL_STATE) + '\n'
+        if not ignore_path.exists() or ignore_path.read_text(encoding='utf-8') != content:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            ignore_path.write_text(content, encoding='utf-8')
+    
+    def state_paths(self) -> set:
+        """
+        需要随 vault 提交的同步状态文件（不存在的文件按删除处理）
+        """
+        return {self.state_dir / name for name in COMMITTED_STATE}
+    
+    def local_state_paths(self) -> set:
+        """
+        不提交的本地状态（旧版本已提交过的，提交时从 vault 仓库中移除，文件本身保留）
+        """
+        return {self.state_dir / name.rstrip('/') for name in LOCAL_STATE}
+    
+    def load_cursor(self) -> dict:
+        """
+        读取同步游标（上次同步到的 lastUpdate / created / _id）
+        """
+        if not self.cursor_path.exists():
+            return {}
+        try:
+            return json.loads(self.cursor_path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ 读取同步游标失败，将按时间窗口全量检查: {e}")
+            return {}
+    
+    def save_cursor(self):
+        """
+        保存同步游标
+        """
+        self.apply_cursor_holds()
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cursor_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.cursor, ensure_ascii=False, indent=2), encoding='utf-8')
+        tmp_path.replace(self.cursor_path)
+    
+    def advance_cursor(self, raindrop: dict, cursor: dict = None):
+        """
+        用已处理的书签推进游标（按 (lastUpdate, _id) 取最大值）
+        cursor 为分片游标，默认推进全局游标
+        """
+        cursor = self.cursor if cursor is None else cursor
+        last_update = raindrop.get('lastUpdate') or raindrop.get('created', '')
+        raindrop_id = raindrop.get('_id', 0)
+        current = (cursor.get('last_update', ''), cursor.get('last_id', 0))
+        if (last_update, raindrop_id) > current:
+            cursor['last_update'] = last_update
+            cursor['last_id'] = raindrop_id
+        created = raindrop.get('created', '')
+        if created > cursor.get('last_created', ''):
+            cursor['last_created'] = created
+    
+    def hold_cursor(self, raindrop: dict, cursor: dict = None):
+        """
+        记录处理出错的书签：保存时游标不会越过它（之后处理成功的书签可能更新，游标取最大值会越过它）
+        """
+        cursor = self.cursor if cursor is None else cursor
+        key = (raindrop.get('lastUpdate') or raindrop.get('created', ''), raindrop.get('_id', 0))
+        held = self.cursor_holds.get(id(cursor))
+        if held is None or key < held[1]:
+            self.cursor_holds[id(cursor)] = (cursor, key)
+    
+    def record_failure(self, raindrop: dict) -> int:
+        """
+        记录书签连续处理失败的次数并返回（随游标保存；书签再次编辑后重新计数）
+        """
+        raindrop_id = str(raindrop.get('_id', ''))
+        last_update = raindrop.get('lastUpdate') or raindrop.get('created', '')
+        failures = self.cursor.setdefault('failures', {})
+        entry = failures.get(raindrop_id)
+        if not entry or entry.get('last_update') != last_update:
+            entry = failures[raindrop_id] = {'last_update': last_update, 'attempts': 0}
+        entry['attempts'] += 1
+        return entry['attempts']
+    
+    def apply_cursor_holds(self):
+        """
+        游标退回到本次最早出错的书签之前，下次同步重新获取并重试它
+        （在它之后、已成功处理的书签会被再次获取，但内容哈希未变，只是跳过）
+        """
+        for cursor, (last_update, raindrop_id) in self.cursor_holds.values():
+            if (cursor.get('last_update', ''), cursor.get('last_id', 0)) >= (last_update, raindrop_id):
+                cursor['last_update'] = last_update
+                cursor['last_id'] = int(raindrop_id) - 1
+        if self.cursor_holds:
+            print("⚠️ 有书签处理出错，游标停在最早出错的书签之前，下次同步重试")
+        self.cursor_holds = {}
+    
+    def is_after_cursor(self, raindrop: dict, cursor: dict = None) -> bool:
+        """
+        判断书签是否在游标之后（新建或被编辑过）
+        """
+        cursor = self.cursor if cursor is None else cursor
+        last_update = raindrop.get('lastUpdate') or raindrop.get('created', '')
+        current = (cursor.get('last_update', ''), cursor.get('last_id', 0))
+        return (last_update, raindrop.get('_id', 0)) > current
     
     def sanitize_filename(self, text: str, max_length: int = 80) -> str:
         """
@@ -44,66 +210,97 @@ class RaindropSync:
             text = text[:max_length].rsplit(' ', 1)[0]
         return text or 'untitled'
     
+    def note_filename(self, raindrop: dict) -> str:
+        """
+        生成笔记文件名：{created_date}-{title}.md
+        """
+        title = raindrop.get('title', 'Untitled')
+        created = raindrop.get('created', '')
+        
+        # 格式化日期
+        try:
+            dt = datetime.fromisoformat(created.replace('Z', '+00:00'))
+            created_date = dt.strftime('%Y-%m-%d')
+        except:
+            created_date = datetime.now().strftime('%Y-%m-%d')
+        
+        # 生成文件名（扁平化存储）
+        safe_title = self.sanitize_filename(title, max_length=60)
+        return f"{created_date}-{safe_title}.md"
+    
     
     def get_raindrops(self, days: int = 7) -> list:
         """
-        获取最近 N 天的书签
+        获取需要同步的书签
+        有游标时只获取游标之后新建/编辑的书签，否则获取最近 N 天的书签
+        """
+        if self.cursor.get('last_update'):
+            return self.get_updated_raindrops()
+        return self.get_recent_raindrops(days)
+    
+    def get_updated_raindrops(self, cursor: dict = None, collection_id: int = 0) -> list:
         """
-        all_raindrops = []
-        page = 0
-        per_page = 50
+        获取游标之后新建或编辑过的书签（collection_id 为 0 时为全部收藏夹）
+        Raindrop 搜索语法只支持按天过滤，这里多取一天再按 (lastUpdate, _id) 精确过滤。
+        无变更时通常只需要一次请求。
+        """
+        cursor = self.cursor if cursor is None else cursor
+        try:
+            last_update = datetime.fromisoformat(cursor['last_update'].replace('Z', '+00:00'))
+            since_day = (last_update - timedelta(days=1)).strftime('%Y-%m-%d')
+        except ValueError:
+            since_day = cursor['last_update'][:10]
         
-        # 计算时间范围
-        since_date = (datetime.now() - timedelta(days=days)).isoformat()
+        items = self.client.get_all_pages(f'/raindrops/{collection_id}', {
+            'sort': '-created',
+            'search': f'lastUpdate:>{since_day}'
+        })
+        return [item for item in items if self.is_after_cursor(item, cursor)]
+    
+    def get_recent_raindrops(self, days: int = 7, collection_id: int = 0) -> list:
+        """
+        获取最近 N 天的书签
+        """
+        # 计算时间范围（API 返回的 created 为 UTC，统一按 UTC 时间比较）
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        since_day = (since - timedelta(days=1)).strftime('%Y-%m-%d')
         
-        while True:
-            url = f"{self.base_url}/raindrops/0"
-            params = {
-                'page': page,
-                'perpage': per_page,
-                'sort': '-created'
-            }
-            
-            try:
-                response = requests.get(url, headers=self.headers, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                items = data.get('items', [])
-                if not items:
-                    break
-                
-                # 过滤最近的书签
-                for item in items:
-                    created = item.get('created', '')
-                    if created >= since_date:
-                        all_raindrops.append(item)
-                    else:
-                        return all_raindrops  # 已经到达时间范围外
-                
-                page += 1
-                
-            except requests.exceptions.RequestException as e:
-                print(f"❌ API 请求失败: {e}")
-                break
+        # 用搜索条件限定范围，拿到总数后即可并发分页
+        items = self.client.get_all_pages(f'/raindrops/{collection_id}', {
+            'sort': '-created',
+            'search': f'created:>{since_day}'
+        })
         
-        return all_raindrops
+        # 过滤最近的书签
+        return [item for item in items if parse_time(item.get('created', '')) >= since]
     
-    def create_markdown(self, raindrop: dict) -> str:
+    def create_markdown(self, raindrop: dict, extra_tags: list = None) -> str:
         """
         创建 Markdown 内容
+        extra_tags 为需要保留的非 Raindrop 标签（如 AI 注入的标签），排在 Raindrop 标签之前
         """
-        title = raindrop.get('title', 'Untitled')
-        url = raindrop.get('link', '')
-        excerpt = raindrop.get('excerpt', '').strip()
-        note = raindrop.get('note', '').strip()
-        highlights = raindrop.get('highlights', [])
-        tags = raindrop.get('tags', [])
-        created = raindrop.get('created', '')
-        cover = raindrop.get('cover', '').strip()
-        domain = raindrop.get('domain', '')
-        collection = raindrop.get('collection', {})
-        collection_title = collection.get('title', 'Unsorted') if isinstance(collection, dict) else 'Unsorted'
+        return self.build_document(raindrop, extra_tags).render()
+    
+    def build_document(self, raindrop: dict, extra_tags: list = None) -> NoteDocument:
+        """
+        根据书签构建笔记文档
+        """
+        # API 对没有内容的字段可能返回 null，统一按空值处理
+        title = raindrop.get('title') or 'Untitled'
+        url = raindrop.get('link') or ''
+        excerpt = (raindrop.get('excerpt') or '').strip()
+        note = (raindrop.get('note') or '').strip()
+        highlights = raindrop.get('highlights') or []
+        tags = raindrop.get('tags') or []
+        if extra_tags:
+            tags = list(dict.fromkeys(list(extra_tags) + list(tags)))
+        created = raindrop.get('created') or ''
+        cover = (raindrop.get('cover') or '').strip()
+        domain = raindrop.get('domain') or ''
+        collection = raindrop.get('collection') or {}
+        # 书签只带收藏夹 $id，标题和父级路径从收藏夹缓存中取
+        collection_title = self.collections.path(collection.get('$id'), collection.get('title', 'Unsorted')) \
+            if isinstance(collection, dict) else 'Unsorted'
         important = raindrop.get('important', False)
         
         # 格式化日期
@@ -119,10 +316,11 @@ class RaindropSync:
         # Front Matter
         content.append('---')
         content.append(f'title: "{title}"')
+        content.append(f'raindrop_id: {raindrop.get("_id", "")}')
         content.append(f'url: {url}')
         content.append(f'domain: {domain}')
         content.append(f'created: {created_date}')
-        content.append(f'source: raindrop')
+        content.append('source: raindrop')
         content.append(f'folder: {collection_title}')
         if tags:
             content.append('tags:')
@@ -173,84 +371,534 @@ class RaindropSync:
             content.append(f'![cover]({cover})')
             content.append('')
         
-        return '\n'.join(content)
+        return NoteDocument.parse('\n'.join(content))
     
-    def sync(self, days: int = 7):
+    def content_hash(self, markdown_content: str) -> str:
         """
-        执行同步
+        Raindrop 渲染内容的哈希，用于判断书签是否有变化
+        """
+        return hashlib.sha1(markdown_content.encode('utf-8')).hexdigest()
+    
+    def update_note(self, raindrop_id: str, entry: dict, raindrop: dict, content_hash: str) -> bool:
+        """
+        原地更新已有笔记的 Raindrop 部分
+        保留 AI 深度总结块和 AI 注入的标签；内容没有实际变化时不写文件
+        """
+        with NOTE_WRITE_LOCK:
+            file_path = self.output_dir / entry['path']
+            existing = file_path.read_text(encoding='utf-8')
+            old_doc = NoteDocument.parse(existing)
+        
+            # AI 注入的标签 = 文件中的标签 - 上次写入的 Raindrop 标签
+            raindrop_tags = raindrop.get('tags', [])
+            previous_tags = entry.get('tags', raindrop_tags)
+            ai_tags = [tag for tag in old_doc.tags if tag not in previous_tags]
+        
+            # 重复收藏 / 相似收藏链接和 AI 总结块（位于文件末尾）原样保留
+            with metrics.timer('stage_seconds', stage='render'):
+                doc = self.build_document(raindrop, extra_tags=ai_tags)
+                for heading in (DUPLICATES_HEADING, SIMILAR_HEADING):
+                    links = old_doc.get_section(heading)
+                    if links:
+                        doc.append_to_section(heading, split_paragraphs(links), before='## 🖼️ 封面')
+                doc.set_ai_block(old_doc.ai_block)
+                new_content = doc.render()
+        
+            self.index.set(raindrop_id, entry['path'], content_hash, raindrop.get('lastUpdate', ''), raindrop_tags)
+            if new_content == existing:
+                return False
+        
+            self.write_note(file_path, new_content)
+            self.manifest.record(entry['path'], doc)
+            if self.search:
+                self.search.update(entry['path'], doc)
+            if self.highlights:
+                self.highlights.mark_rendered(raindrop_id, raindrop.get('highlights', []))
+            return True
+    
+    def link_duplicate(self, entry: dict, raindrop: dict) -> bool:
+        """
+        在保留的笔记中登记重复收藏的链接（已登记过时更新标题 / 链接，没有变化时不写入），
+        保留笔记不存在时返回 False
+        """
+        with NOTE_WRITE_LOCK:
+            file_path = self.output_dir / entry['path']
+            if not file_path.exists():
+                return False
+            doc = NoteDocument.from_file(file_path)
+            url = raindrop.get('link', '')
+            line = f"- [{raindrop.get('title', 'Untitled')}]({url}) · {raindrop.get('created', '')[:10]} · " \
+                   f"raindrop_id: {raindrop.get('_id', '')}"
+            lines = split_paragraphs(doc.get_section(DUPLICATES_HEADING) or '')
+            marker = f"raindrop_id: {raindrop.get('_id', '')}"
+            registered = [index for index, existing in enumerate(lines) if existing.endswith(marker)]
+            if registered:
+                if lines[registered[0]] == line:
+                    return True
+                lines[registered[0]] = line
+                doc.set_section(DUPLICATES_HEADING, '\n' + '\n\n'.join(lines) + '\n\n')
+            else:
+                doc.append_to_section(DUPLICATES_HEADING, [line], before='## 🖼️ 封面')
+            self.save_links(entry['path'], doc)
+            return True
+    
+    def unlink_duplicate(self, kept_id: str, raindrop_id: str):
+        """
+        书签不再与保留的笔记重复（链接改了）时，从保留笔记中移除它的登记
+        """
+        with NOTE_WRITE_LOCK:
+            entry = self.index.get(kept_id)
+            if not entry or not (self.output_dir / entry['path']).exists():
+                return
+            doc = NoteDocument.from_file(self.output_dir / entry['path'])
+            marker = f"raindrop_id: {raindrop_id}"
+            lines = split_paragraphs(doc.get_section(DUPLICATES_HEADING) or '')
+            remaining = [line for line in lines if not line.endswith(marker)]
+            if len(remaining) == len(lines):
+                return
+            if remaining:
+                doc.set_section(DUPLICATES_HEADING, '\n' + '\n\n'.join(remaining) + '\n\n')
+            else:
+                doc.sections = [section for section in doc.sections if section[0] != DUPLICATES_HEADING]
+            self.save_links(entry['path'], doc)
+    
+    def save_links(self, filename: str, doc: NoteDocument):
+        """
+        写回改动了重复收藏链接的笔记
         """
-        print(f"🚀 开始同步最近 {days} 天的 Raindrop 书签...")
+        file_path = self.output_dir / filename
+        self.write_note(file_path, doc.render())
+        self.manifest.record(filename, doc)
+        if self.search:
+            self.search.update(filename, doc)
+        self.touched_paths.add(file_path)
+    
+    def write_note(self, file_path: Path, content: str):
+        """
+        写入笔记并记录耗时和字节数
+        """
+        data = content.encode('utf-8')
+        with metrics.timer('stage_seconds', stage='write'):
+            file_path.write_bytes(data)
+        metrics.inc('bytes_written_total', len(data), stage='sync')
+    
+    def sync_one(self, raindrop: dict, doc: NoteDocument = None, cursor: dict = None):
+        """
+        同步单个书签：新建、重命名或原地更新对应笔记，结果计入 self.counts
+        doc 为已渲染好的文档（全量导出时由渲染线程池预先构建）；cursor 为分片游标（与全局游标一起推进）
+        """
+        raindrop_id = str(raindrop.get('_id', ''))
+        failed = False
+        
+        try:
+            url = raindrop.get('link', '')
+            base_filename = self.note_filename(raindrop)
+            
+            # 通过索引判断书签是否已有笔记（首次遇到旧笔记时按 URL 认领）
+            entry = self.index.get(raindrop_id)
+            if not entry and url:
+                legacy_path = self.index.claim_legacy(url)
+                if legacy_path:
+                    self.index.set(raindrop_id, legacy_path, last_update=raindrop.get('lastUpdate', ''))
+                    entry = self.index.get(raindrop_id)
+            
+            if entry:
+                self.dedup.add(raindrop_id, raindrop)
+                # 标题变化时重命名已有笔记，而不是生成重复笔记
+                if entry['path'] != base_filename and self.index.owner(base_filename) is None:
+                    old_path = self.output_dir / entry['path']
+                    new_path = self.output_dir / base_filename
+                    if old_path.exists() and not new_path.exists():
+                        old_path.rename(new_path)
+                        self.touched_paths.update([old_path, new_path])
+                        self.manifest.rename(entry['path'], base_filename)
+                        self.jobs.rename(entry['path'], base_filename)
+                        if self.search:
+                            self.search.rename(entry['path'], base_filename)
+                        self.index.set(raindrop_id, base_filename, last_update=raindrop.get('lastUpdate', ''))
+                        self.counts['renamed'] += 1
+                        print(f"🔀 重命名: {entry['path']} -> {base_filename}")
+                    entry = self.index.get(raindrop_id)
+                
+                # 只在 Raindrop 部分的哈希变化时才读写文件，减少 git 变更
+                with metrics.timer('stage_seconds', stage='render'):
+                    markdown = doc.render() if doc else self.create_markdown(raindrop)
+                content_hash = self.content_hash(markdown)
+                if self.update_existing and content_hash != entry.get('hash'):
+                    if self.update_note(raindrop_id, entry, raindrop, content_hash):
+                        self.counts['updated'] += 1
+                        self.updated_files.append(entry['path'])
+                        self.touched_paths.add(self.output_dir / entry['path'])
+                        print(f"♻️ 更新: {entry['path']}")
+                        return
+                self.counts['skipped'] += 1
+                print(f"⏩ 跳过 (笔记未变化): {entry['path']}")
+                return
+            
+            # 重复收藏：与已有笔记的规范化 URL 相同时，只在已有笔记中登记链接，
+            # 不新建笔记（也就不会再触发 AI 总结和标签请求）；每次同步都重新判断，链接改了就不再合并
+            kept_id = self.dedup.find(raindrop)
+            merged_into = self.dedup.kept_for(raindrop_id)
+            if merged_into and merged_into != kept_id:
+                self.unlink_duplicate(merged_into, raindrop_id)
+                self.dedup.unmark_duplicate(raindrop_id)
+            kept = self.index.get(kept_id) if kept_id else None
+            if kept and self.link_duplicate(kept, raindrop):
+                self.dedup.mark_duplicate(raindrop_id, kept_id)
+                self.counts['duplicate'] += 1
+                print(f"🔁 重复收藏: {raindrop.get('title', '')} -> {kept['path']}")
+                return
+            # 标题 / 摘要指纹相近的只是内容相似，照常新建笔记，在新笔记中链接到相似的笔记
+            similar_id, distance = self.dedup.similar(raindrop)
+            similar = self.index.get(similar_id) if similar_id else None
+            
+            # 同一天同标题的不同书签，文件名追加 _id 区分
+            # （文件已存在但属于同一书签时直接覆盖，如导出中断后索引尚未保存）
+            filename = base_filename
+            if self.index.owner(filename) is not None or (
+                    (self.output_dir / filename).exists()
+                    and read_frontmatter(self.output_dir / filename).get('raindrop_id') != raindrop_id):
+                filename = f"{filename[:-3]}-{raindrop_id}.md"
+            
+            # 生成 Markdown
+            with metrics.timer('stage_seconds', stage='render'):
+                doc = doc or self.build_document(raindrop)
+                markdown_content = doc.render()
+                # 内容哈希只覆盖 Raindrop 部分（与更新时的比较口径一致）
+                content_hash = self.content_hash(markdown_content)
+                if similar:
+                    doc.append_to_section(SIMILAR_HEADING, [f"- [[{similar['path'][:-3]}]] · SimHash 距离 {distance}"],
+                                          before='## 🖼️ 封面')
+                    markdown_content = doc.render()
+            
+            # 写入文件（扁平化存储）
+            file_path = self.output_dir / filename
+            self.write_note(file_path, markdown_content)
+            self.manifest.record(filename, doc)
+            if self.search:
+                self.search.update(filename, doc)
+            
+            self.index.set(raindrop_id, filename, content_hash,
+                           raindrop.get('lastUpdate', ''), raindrop.get('tags', []))
+            self.dedup.add(raindrop_id, raindrop)
+            if self.highlights:
+                self.highlights.mark_rendered(raindrop_id, raindrop.get('highlights', []))
+            self.counts['created'] += 1
+            self.created_files.append(filename)
+            self.touched_paths.add(file_path)
+            print(f"✅ 新增: {filename}" + (f" (与 {similar['path']} 相似)" if similar else ''))
+            if self.on_note_created:
+                self.on_note_created(filename, doc)
+        
+        except Exception as e:
+            failed = True
+            self.counts['error'] += 1
+            print(f"❌ 处理书签出错 ({raindrop_id}): {e}")
         
-        # 获取书签
-        raindrops = self.get_raindrops(days)
-        print(f"📥 获取到 {len(raindrops)} 个书签")
+        finally:
+            # 出错的书签不推进游标，下次同步重试；连续失败 SYNC_MAX_ATTEMPTS 次后跳过，不再卡住游标
+            if failed and self.record_failure(raindrop) >= SYNC_MAX_ATTEMPTS:
+                print(f"⛔ 书签 {raindrop_id} 连续 {SYNC_MAX_ATTEMPTS} 次处理失败，跳过（再次编辑后重新同步）")
+                metrics.inc('sync_skipped_total')
+                failed = False
+            elif not failed:
+                self.cursor.get('failures', {}).pop(raindrop_id, None)
+            update_cursor = self.hold_cursor if failed else self.advance_cursor
+            update_cursor(raindrop)
+            if cursor is not None:
+                update_cursor(raindrop, cursor)
+    
+    def sync(self, days: int = 7, raindrops: list = None):
+        """
+        执行同步
+        raindrops 为已获取的书签（如 watch 模式的轮询结果），为 None 时自动获取
+        """
+        self.created_files = []
+        self.updated_files = []
+        self.touched_paths = set()
+        started_at = time.time()
         
-        new_count = 0
-        skipped_count = 0
+        self.reset_counts()
         
-        for raindrop in raindrops:
-            raindrop_id = str(raindrop.get('_id', ''))
+        if raindrops is None and self.shard_workers:
+            fetched = self.sync_shards(days)
+        else:
+            if raindrops is None:
+                print(f"🚀 开始同步最近 {days} 天的 Raindrop 书签...")
+                
+                # 获取书签（请求失败时中止本次同步，不推进游标，避免漏同步）
+                try:
+                    with metrics.timer('stage_seconds', stage='fetch'):
+                        raindrops = self.get_raindrops(days)
+                except ApiError as e:
+                    metrics.inc('sync_failures_total')
+                    print(f"❌ API 请求失败: {e}")
+                    return
+            print(f"📥 获取到 {len(raindrops)} 个书签")
             
+            for raindrop in raindrops:
+                self.sync_one(raindrop)
+            fetched = len(raindrops)
+        
+        # 新笔记写完后再追加高亮，已有笔记只改动高亮章节
+        if self.highlights:
             try:
-                title = raindrop.get('title', 'Untitled')
-                url = raindrop.get('link', '')
-                created = raindrop.get('created', '')
-                collection = raindrop.get('collection', {})
-                collection_title = collection.get('title', 'Unsorted') if isinstance(collection, dict) else 'Unsorted'
-                
-                # 格式化日期
+                self.counts['highlighted'] = self.highlights.run()
+            except ApiError as e:
+                print(f"❌ 高亮同步失败: {e}")
+        
+        try:
+            self.index.save()
+            self.manifest.save()
+            self.dedup.save()
+            self.collections.save()
+            if self.highlights:
+                self.highlights.save()
+        except OSError as e:
+            print(f"❌ 保存笔记索引失败: {e}")
+        if self.search:
+            try:
+                self.search.save()
+            except sqlite3.Error as e:
+                print(f"❌ 更新搜索索引失败: {e}")
+        
+        # 新笔记登记到 AI 任务队列（同一进程的 AI 流水线在本次同步开始后已认领的任务保持不变）
+        for filename in self.created_files:
+            self.jobs.add(filename, self.manifest.entries.get(filename), started_at)
+        try:
+            self.jobs.save()
+            if self.created_files:
+                print(f"📋 已登记 {len(self.created_files)} 个 AI 任务")
+        except sqlite3.Error as e:
+            print(f"❌ 登记 AI 任务失败: {e}")
+        
+        # 保存游标，下次只拉取之后变更的书签
+        if fetched:
+            try:
+                self.save_cursor()
+            except OSError as e:
+                print(f"❌ 保存同步游标失败: {e}")
+        
+        metrics.inc('bookmarks_fetched_total', fetched)
+        self.print_summary("同步完成")
+    
+    def sync_shards(self, days: int) -> int:
+        """
+        按收藏夹分片同步，返回获取到的书签数
+        每个收藏夹是一个分片，有自己的游标（保存在 cursor.json 的 shards 中）；
+        各分片并发获取，先取完的分片先写入，书签多的收藏夹不会拖慢其他收藏夹。
+        某个分片失败时只有它的游标不前进，下次重试。
+        """
+        try:
+            collection_ids = self.collections.ids()
+        except ApiError as e:
+            print(f"❌ API 请求失败: {e}")
+            return 0
+        shard_cursors = self.cursor.setdefault('shards', {})
+        # 在主线程中准备好每个分片的游标，获取线程只读
+        cursors = {collection_id: shard_cursors.setdefault(str(collection_id), {})
+                   for collection_id in collection_ids}
+        print(f"🧩 按收藏夹分片同步: {len(collection_ids)} 个分片, {self.shard_workers} 并发")
+        
+        def fetch(collection_id: int) -> list:
+            cursor = cursors[collection_id]
+            with metrics.timer('stage_seconds', stage='fetch'):
+                if cursor.get('last_update'):
+                    return self.get_updated_raindrops(cursor, collection_id)
+                return self.get_recent_raindrops(days, collection_id)
+        
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=self.shard_workers) as executor:
+            futures = {executor.submit(fetch, collection_id): collection_id for collection_id in collection_ids}
+            for future in as_completed(futures):
+                collection_id = futures[future]
                 try:
-                    dt = datetime.fromisoformat(created.replace('Z', '+00:00'))
-                    created_date = dt.strftime('%Y-%m-%d')
-                except:
-                    created_date = datetime.now().strftime('%Y-%m-%d')
-                
-                # 生成文件名（扁平化存储）
-                safe_title = self.sanitize_filename(title, max_length=60)
-                base_filename = f"{created_date}-{safe_title}.md"
-                
-                # 检查文件是否存在，如果存在则跳过
-                file_path = self.output_dir / base_filename
-                if file_path.exists():
-                    skipped_count += 1
-                    print(f"⏩ 跳过 (文件已存在): {base_filename}")
+                    raindrops = future.result()
+                except ApiError as e:
+                    metrics.inc('sync_failures_total')
+                    print(f"❌ 分片 {self.collections.path(collection_id)} 获取失败: {e}")
                     continue
-                
-                filename = base_filename
-                
-                # 生成 Markdown
-                markdown_content = self.create_markdown(raindrop)
-                
-                # 写入文件（扁平化存储）
-                file_path = self.output_dir / filename
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(markdown_content)
-                
-                new_count += 1
-                self.created_files.append(filename)
-                print(f"✅ 新增: {filename}")
-            
-            except Exception as e:
-                print(f"❌ 处理书签出错 ({raindrop_id}): {e}")
-                continue
+                if raindrops:
+                    print(f"📥 分片 {self.collections.path(collection_id)}: {len(raindrops)} 个书签")
+                for raindrop in raindrops:
+                    self.sync_one(raindrop, cursor=cursors[collection_id])
+                fetched += len(raindrops)
+        return fetched
+    
+    def reset_counts(self):
+        self.counts = dict.fromkeys(('created', 'updated', 'renamed', 'skipped', 'duplicate', 'error'), 0)
+    
+    def print_summary(self, title: str):
+        for action, count in self.counts.items():
+            metrics.inc('notes_total', count, action=action)
         
-        # Write report file
-        if self.created_files:
-            workspace = os.getenv('GITHUB_WORKSPACE', '.')
-            report_path = Path(workspace) / 'new_files_list.txt'
-            
+        print(f"\n📊 {title}:")
+        print(f"   - 新增: {self.counts['created']} 个文件")
+        print(f"   - 更新: {self.counts['updated']} 个文件")
+        print(f"   - 重命名: {self.counts['renamed']} 个文件")
+        print(f"   - 跳过: {self.counts['skipped']} 个文件")
+        print(f"   - 重复收藏（已合并，未新建）: {self.counts['duplicate']} 个书签")
+        if self.counts.get('highlighted'):
+            print(f"   - 追加高亮: {self.counts['highlighted']} 个文件")
+        if self.counts['error']:
+            print(f"   - 出错: {self.counts['error']} 个书签")
+        print(f"   - 输出目录: {self.output_dir}")
+    
+    def load_checkpoint(self) -> dict:
+        """
+        读取全量导出断点
+        """
+        if not self.checkpoint_path.exists():
+            return {}
+        try:
+            return json.loads(self.checkpoint_path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ 读取导出断点失败，将从头导出: {e}")
+            return {}
+    
+    def save_checkpoint(self, checkpoint: dict):
+        """
+        保存导出断点（与索引、清单一起保存，保证三者一致）
+        """
+        self.index.save()
+        self.manifest.save()
+        self.dedup.save()
+        if self.search:
+            self.search.save()
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(checkpoint, ensure_ascii=False, indent=2), encoding='utf-8')
+        tmp_path.replace(self.checkpoint_path)
+    
+    def export(self, workers: int = 4, restart: bool = False, save_every: int = 20) -> bool:
+        """
+        全量导出整个书签库，返回是否完整导出
+        按 created 升序逐页惰性获取（导出期间新增的书签只会排在末尾，断点页码保持有效），
+        书签在线程池中渲染、由单个线程写入，队列有界，内存不随书签总数增长。
+        每完整写入 save_every 页保存一次断点（页码 + 该页最后一个 _id），中断后再次运行从断点继续。
+        """
+        self.created_files = []
+        self.updated_files = []
+        self.touched_paths = set()
+        self.reset_counts()
+        
+        checkpoint = {} if restart else self.load_checkpoint()
+        start_page = checkpoint.get('page', 0)
+        last_id = checkpoint.get('last_id')
+        if checkpoint:
+            print(f"⏯️ 从断点继续导出: 第 {start_page} 页 _id {last_id} 之后 (已导出 {checkpoint.get('exported', 0)} 个)")
+        else:
+            print("🚀 开始全量导出 Raindrop 书签库...")
+        
+        lock = threading.Lock()
+        # 页码 -> 尚未写入的书签数 / 该页最后一个 _id
+        pending = {}
+        page_last = {}
+        done_pages = set()
+        progress = {'next_page': start_page, 'pages_since_save': 0,
+                    'exported': checkpoint.get('exported', 0), 'error': None}
+        
+        def complete(page: int):
+            # 只有之前的页都已写完，断点才能前移（渲染线程池可能打乱完成顺序）
+            done_pages.add(page)
+            while progress['next_page'] in done_pages:
+                done_page = progress['next_page']
+                done_pages.discard(done_page)
+                checkpoint.update(page=done_page, last_id=page_last.pop(done_page, last_id),
+                                  exported=progress['exported'])
+                progress['next_page'] += 1
+                progress['pages_since_save'] += 1
+        
+        def items():
+            try:
+                for page, raindrops in self.client.iter_pages('/raindrops/0', {'sort': 'created'},
+                                                              start_page=start_page):
+                    metrics.inc('bookmarks_fetched_total', len(raindrops))
+                    if page == start_page and last_id is not None:
+                        ids = [raindrop.get('_id') for raindrop in raindrops]
+                        if last_id in ids:
+                            raindrops = raindrops[ids.index(last_id) + 1:]
+                    with lock:
+                        if not raindrops:
+                            complete(page)
+                            continue
+                        pending[page] = len(raindrops)
+                        page_last[page] = raindrops[-1].get('_id')
+                    for raindrop in raindrops:
+                        yield page, raindrop
+            except ApiError as e:
+                # 正常结束生成器，让流水线写完已获取的书签后再保存断点
+                progress['error'] = e
+        
+        def render(job: tuple) -> tuple:
+            page, raindrop = job
             try:
-                with open(report_path, 'w', encoding='utf-8') as f:
-                    for filename in self.created_files:
-                        f.write(f"{filename}\n")
-                print(f"📝 已生成文件列表: {report_path} ({len(self.created_files)} 个文件)")
-            except Exception as e:
-                print(f"❌ 写入列表失败: {e}")
+                return page, raindrop, self.build_document(raindrop)
+            except Exception:
+                # 交给写入阶段的 sync_one 重新渲染，出错时计数并让游标停在它之前
+                return page, raindrop, None
+        
+        def write(job: tuple) -> str:
+            page, raindrop, doc = job
+            self.sync_one(raindrop, doc)
+            with lock:
+                progress['exported'] += 1
+                pending[page] -= 1
+                if pending[page] == 0:
+                    del pending[page]
+                    complete(page)
+                # 索引和清单只由写入线程修改，断点也在这里保存
+                if progress['pages_since_save'] >= save_every:
+                    self.save_checkpoint(checkpoint)
+                    progress['pages_since_save'] = 0
+                    print(f"💾 导出断点: 第 {checkpoint['page']} 页, 已导出 {checkpoint['exported']} 个")
+            return raindrop.get('_id')
+        
+        # 各阶段耗时由 Stage 自己记入 stage_seconds；写入阶段命名为 sync（整个 sync_one），
+        # 与 write_note 记录的文件写入耗时（stage=write）分开，不重复计数
+        pipeline = Pipeline([
+            Stage('render', render, workers=workers, maxsize=workers * 4),
+            Stage('sync', write, workers=1, maxsize=workers * 4)
+        ], collect=False)
+        pipeline.run(items())
+        try:
+            self.save_checkpoint(checkpoint)
+        except (OSError, sqlite3.Error) as e:
+            print(f"❌ 保存导出断点失败: {e}")
+        pipeline.print_stats()
+        
+        finished = progress['error'] is None
+        if finished:
+            # 导出完成：删除断点，保存游标，之后的定时同步只拉取增量
+            self.checkpoint_path.unlink(missing_ok=True)
+            try:
+                self.save_cursor()
+            except OSError as e:
+                print(f"❌ 保存同步游标失败: {e}")
+        else:
+            metrics.inc('sync_failures_total')
+            print(f"❌ API 请求失败，导出中断（已保存断点，再次运行将继续）: {progress['error']}")
+        
+        self.print_summary("导出完成" if finished else "导出中断")
+        if self.created_files:
+            print("💡 可运行 ai_summarizer.py --backfill 为导出的笔记补全 AI 总结")
+        return finished
 
-        print(f"\n📊 同步完成:")
-        print(f"   - 新增: {new_count} 个文件")
-        print(f"   - 跳过: {skipped_count} 个文件")
-        print(f"   - 输出目录: {self.output_dir}")
+
+def split_paragraphs(text: str) -> list:
+    return [paragraph for paragraph in text.strip('\n').split('\n\n') if paragraph.strip()]
+
+
+def parse_time(value: str) -> datetime:
+    """
+    解析 API 返回的 ISO 时间（如 2024-01-01T08:00:00.000Z），无法解析时返回最早时间
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return datetime.min.replace(tzinfo=timezone.utc)
+    # 没有时区信息的按 UTC 处理
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
 
 
 def main():
@@ -272,8 +920,29 @@ def main():
     output_dir = os.getenv('OUTPUT_DIR', '30_Resources')
     
     # 执行同步
-    syncer = RaindropSync(api_token, output_dir)
-    syncer.sync(days)
+    # 是否原地更新有变化的已有笔记（默认开启）
+    update_existing = os.getenv('SYNC_UPDATE', '1') != '0'
+    
+    parser = argparse.ArgumentParser(description='同步 Raindrop 书签到 Markdown 笔记')
+    parser.add_argument('--profile', action='store_true', help='对同步过程做 cProfile + tracemalloc 剖析')
+    parser.add_argument('--export', action='store_true', help='全量导出整个书签库（可断点续传）')
+    parser.add_argument('--workers', type=int, default=4, help='全量导出的渲染线程数')
+    parser.add_argument('--restart', action='store_true', help='忽略导出断点，从头导出')
+    args = parser.parse_args()
+    
+    # 按收藏夹分片并行同步的并发数（0 为不分片）
+    shard_workers = int(os.getenv('SYNC_SHARDS', '0'))
+    
+    sync_highlights = os.getenv('SYNC_HIGHLIGHTS', '1') != '0'
+    
+    syncer = RaindropSync(api_token, output_dir, update_existing, shard_workers=shard_workers,
+                          sync_highlights=sync_highlights)
+    with profile('raindrop_sync', enabled=args.profile):
+        if args.export:
+            syncer.export(workers=args.workers, restart=args.restart)
+        else:
+            syncer.sync(days)
+    metrics.write('raindrop_sync')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Raindrop 同步 + AI 总结 一体化入口
+在同一进程中运行同步和 AI 流水线：同步写下原始笔记后，立即通过内存队列交给 AI 总结/标签阶段，
+每个笔记最多再被改写一次，整个运行只需提交、推送一次。
+"""
+
+import argparse
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+from ai_summarizer import create_ai_clients, run_ai_pipeline
+from api_client import ApiError
+from metrics import metrics, profile
+from raindrop_api_sync import RaindropSync
+from vault_writer import VaultWriter, VaultWriterError, default_message
+
+
+def run(syncer: RaindropSync, days: int, concurrency: int = 3, rate_per_minute: int = 30,
+        tag_batch_size: int = 8, raindrops: list = None, ai_clients: tuple = None,
+        budget: float = 0, max_concurrency: int = 0) -> set:
+    """
+    同步并为新笔记生成 AI 总结，返回本次改动过的路径（笔记 + 需要提交的同步状态文件）
+    raindrops 为已获取的书签；ai_clients 为复用的 (AISummarizer, AITagger)
+    budget 秒后 AI 步骤不再派发新笔记（0 表示不限）
+    """
+    ai_summarizer, ai_tagger = ai_clients or create_ai_clients()
+    if not ai_summarizer:
+        syncer.sync(days, raindrops)
+        return syncer.touched_paths | syncer.state_paths()
+
+    # 同步线程产生新笔记，AI 流水线在主线程边收边处理
+    notes = queue.Queue()
+    syncer.on_note_created = lambda filename, doc: notes.put((syncer.output_dir / filename, doc))
+
+    def sync_worker():
+        try:
+            syncer.sync(days, raindrops)
+        finally:
+            notes.put(None)
+
+    sync_thread = threading.Thread(target=sync_worker, name='raindrop-sync', daemon=True)
+    sync_thread.start()
+
+    written = run_ai_pipeline(syncer.output_dir, iter(notes.get, None), ai_summarizer, ai_tagger,
+                              syncer.manifest, concurrency=concurrency, rate_per_minute=rate_per_minute,
+                              tag_batch_size=tag_batch_size, budget=budget, max_concurrency=max_concurrency)
+    sync_thread.join()
+    return syncer.touched_paths | set(written) | syncer.state_paths()
+
+
+def commit_vault(syncer: RaindropSync, paths: set, push: bool = False):
+    """
+    只暂存本次改动的路径并生成一个提交（SQLite 数据库等本地状态不提交）
+    """
+    try:
+        writer = VaultWriter.for_path(syncer.output_dir)
+        writer.touch(*paths)
+        writer.untrack(*syncer.local_state_paths())
+        if writer.commit(default_message()) and push:
+            writer.push(branch=os.getenv('VAULT_BRANCH', 'main'))
+    except VaultWriterError as e:
+        print(f"❌ 提交 vault 失败: {e}")
+
+
+def watch(syncer: RaindropSync, days: int, min_interval: float = 30, max_interval: float = 900,
+          commit: bool = False, push: bool = False, **options):
+    """
+    常驻轮询模式
+    保持 HTTP 连接、笔记索引和清单常驻内存；每次只用一次带游标的小请求检查变更，
+    有变更时才执行同步和 AI 步骤。有活动后轮询间隔回到 min_interval，空闲时指数退避到 max_interval。
+    """
+    ai_clients = create_ai_clients()
+    interval = min_interval
+    print(f"👀 进入 watch 模式: 轮询间隔 {min_interval:.0f}s ~ {max_interval:.0f}s")
+
+    while True:
+        try:
+            raindrops = syncer.get_raindrops(days)
+        except ApiError as e:
+            print(f"❌ API 请求失败: {e}")
+            raindrops = []
+
+        if raindrops:
+            paths = run(syncer, days, raindrops=raindrops, ai_clients=ai_clients, **options)
+            if commit:
+                commit_vault(syncer, paths, push)
+            # 计数器在进程内累积，每轮写出一次供 Prometheus 采集
+            metrics.write('raindrop_pipeline')
+            interval = min_interval
+        else:
+            interval = min(interval * 2, max_interval)
+
+        # 加少量抖动，避免与其他定时任务同时触发
+        wait = interval * random.uniform(0.9, 1.1)
+        print(f"💤 {wait:.0f}s 后再次检查")
+        time.sleep(wait)
+
+
+def main():
+    """
+    主函数
+    """
+    # 从环境变量获取 API Token
+    api_token = os.getenv('RAINDROP_API_TOKEN')
+
+    if not api_token:
+        print("❌ 错误: 请设置环境变量 RAINDROP_API_TOKEN")
+        print("   获取 Token: https://app.raindrop.io/settings/integrations")
+        sys.exit(1)
+
+    days = int(os.getenv('SYNC_DAYS', '7'))
+    output_dir = os.getenv('OUTPUT_DIR', '30_Resources')
+    update_existing = os.getenv('SYNC_UPDATE', '1') != '0'
+
+    parser = argparse.ArgumentParser(description='同步 Raindrop 书签并生成 AI 总结')
+    parser.add_argument('--watch', action='store_true', help='常驻运行，自适应轮询 Raindrop 变更')
+    parser.add_argument('--min-interval', type=float, default=30, help='watch 模式最短轮询间隔（秒）')
+    parser.add_argument('--max-interval', type=float, default=900, help='watch 模式最长轮询间隔（秒）')
+    parser.add_argument('--commit', action='store_true', help='只暂存本次改动的路径并提交到 vault 仓库')
+    parser.add_argument('--push', action='store_true', help='提交后推送（需配合 --commit）')
+    parser.add_argument('--profile', action='store_true', help='对单次运行做 cProfile + tracemalloc 剖析')
+    args = parser.parse_args()
+
+    shard_workers = int(os.getenv('SYNC_SHARDS', '0'))
+    
+    sync_highlights = os.getenv('SYNC_HIGHLIGHTS', '1') != '0'
+    
+    syncer = RaindropSync(api_token, output_dir, update_existing, shard_workers=shard_workers,
+                          sync_highlights=sync_highlights)
+    options = {
+        'concurrency': int(os.getenv('AI_CONCURRENCY', '3')),
+        'rate_per_minute': int(os.getenv('AI_RATE_PER_MINUTE', '30')),
+        'tag_batch_size': int(os.getenv('AI_TAG_BATCH_SIZE', '8')),
+        'budget': float(os.getenv('AI_TIME_BUDGET', '0')),
+        'max_concurrency': int(os.getenv('AI_MAX_CONCURRENCY', '0'))
+    }
+
+    if args.watch:
+        try:
+            watch(syncer, days, args.min_interval, args.max_interval, args.commit, args.push, **options)
+        except KeyboardInterrupt:
+            print("👋 已退出 watch 模式")
+        return
+
+    with profile('raindrop_pipeline', enabled=args.profile):
+        paths = run(syncer, days, **options)
+    if args.commit:
+        with metrics.timer('stage_seconds', stage='commit'):
+            commit_vault(syncer, paths, args.push)
+    metrics.write('raindrop_pipeline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Raindrop 笔记全文搜索索引
+SQLite FTS5 索引（以 raindrop_id 为键），覆盖标题、标签、收藏夹、域名、高亮 / 我的笔记、AI 总结和正文，
+按相关度（bm25）排序，可按标签、域名、日期过滤。
+中日韩文字按相邻二字组（bigram）切分后建立索引，查询词按短语匹配，常用字不会拖慢查询。
+
+索引保存在 Raindrop/.search/index.sqlite（不在 .sync 中，不随 vault 提交）；
+索引存在时，同步和 AI 步骤写笔记后增量更新对应条目，--refresh 只重新索引 mtime / size 变化的笔记。
+
+用法：
+    uv run search_index.py 缓存 策略 --tag python --domain github.com --since 2024-01-01
+    uv run search_index.py --refresh
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from metrics import metrics
+from note_document import NoteDocument
+
+# 积累多少条更新后自动写入一次
+FLUSH_EVERY = 500
+# 各列的 bm25 权重：title, tags, folder, domain, highlights, summary, body
+COLUMN_WEIGHTS = (10.0, 5.0, 2.0, 2.0, 3.0, 2.0, 1.0)
+# 高亮和自己的笔记单独成列，权重高于正文；封面只有图片链接，不参与索引
+HIGHLIGHT_SECTIONS = ('## ✨ 高亮标注', '## 💡 我的笔记')
+SKIPPED_SECTIONS = HIGHLIGHT_SECTIONS + ('## 🖼️ 封面',)
+
+# 结果摘录的长度（字符数）
+SNIPPET_WIDTH = 80
+
+CJK_RUN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+')
+
+
+def segment(text: str) -> str:
+    """
+    连续的中日韩文字切分为相邻二字组（unicode61 分词器会把整段汉字当作一个词），
+    「缓存策略」-> 「缓存 存策 策略」，按短语查询时二字组位置相邻即可命中
+    """
+    def bigrams(match) -> str:
+        run = match.group()
+        return ' ' + (' '.join(run[i:i + 2] for i in range(len(run) - 1)) if len(run) > 1 else run) + ' '
+    return CJK_RUN.sub(bigrams, text)
+
+
+def build_query(text: str) -> str:
+    """
+    把用户输入转换为 FTS5 查询：空格分隔的词都要出现（AND），每个词按短语匹配；
+    英文词以 * 结尾、或只有一个汉字时为前缀匹配
+    """
+    terms = []
+    for word in text.split():
+        term = word.rstrip('*').replace('"', '')
+        if not term:
+            continue
+        prefix = (word.endswith('*') and term.isascii()) or (len(term) == 1 and bool(CJK_RUN.match(term)))
+        terms.append(f'"{segment(term).strip()}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def make_snippet(text: str, terms: list, width: int = SNIPPET_WIDTH) -> str:
+    """
+    截取第一个查询词附近的一段文字，查询词加粗
+    """
+    # 去掉引用标记（高亮），合并空白
+    text = re.sub(r'\s+', ' ', re.sub(r'(?m)^\s*>\s?', '', text)).strip()
+    pattern = re.compile('|'.join(map(re.escape, sorted(terms, key=len, reverse=True))), re.IGNORECASE)
+    match = pattern.search(text)
+    if not match:
+        return ''
+    start = max(0, match.start() - width // 4)
+    excerpt = pattern.sub(lambda found: f'**{found.group()}**', text[start:start + width])
+    return ('…' if start else '') + excerpt + ('…' if start + width < len(text) else '')
+
+
+def note_fields(doc: NoteDocument) -> dict:
+    """
+    从笔记中提取索引字段
+    """
+    sections = {heading: text for heading, text in doc.sections}
+    summary = doc.ai_block.split('\n', 1)[1] if '\n' in doc.ai_block else ''
+    domain = doc.get('domain').lower()
+    return {
+        'title': doc.get('title'),
+        'tags': doc.tags,
+        'folder': doc.get('folder'),
+        'domain': domain[4:] if domain.startswith('www.') else domain,
+        'created': doc.get('created'),
+        'highlights': '\n'.join(sections.get(heading) or '' for heading in HIGHLIGHT_SECTIONS),
+        'summary': summary,
+        'body': ''.join(text for heading, text in doc.sections if heading not in SKIPPED_SECTIONS)
+    }
+
+
+class SearchIndex:
+    """
+    raindrop_id -> 笔记全文索引
+    """
+    def __init__(self, notes_dir: Path, db_path: Path = None):
+        self.notes_dir = Path(notes_dir)
+        self.db_path = Path(db_path or self.notes_dir / '.search' / 'index.sqlite')
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 尚未写入数据库的更新：raindrop_id -> (文件名, mtime, size, 字段)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        # WAL：查询不会被同步 / AI 步骤的写入阻塞
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS notes (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                title TEXT,
+                domain TEXT,
+                created TEXT,
+                mtime REAL,
+                size INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS notes_path ON notes (path);
+            CREATE INDEX IF NOT EXISTS notes_domain ON notes (domain);
+            CREATE INDEX IF NOT EXISTS notes_created ON notes (created);
+            CREATE TABLE IF NOT EXISTS note_tags (
+                tag TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                PRIMARY KEY (tag, id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS note_tags_id ON note_tags (id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5 (
+                title, tags, folder, domain, highlights, summary, body,
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+        """)
+
+    @classmethod
+    def open(cls, notes_dir: Path):
+        """
+        索引已存在时打开（同步 / AI 步骤据此决定是否增量更新），否则返回 None
+        """
+        db_path = Path(notes_dir) / '.search' / 'index.sqlite'
+        return cls(notes_dir, db_path) if db_path.exists() else None
+
+    def update(self, filename: str, doc: NoteDocument):
+        """
+        笔记写入后登记更新（缓存在内存中，save 或积累 FLUSH_EVERY 条时写入）
+        没有 raindrop_id 的笔记不索引
+        """
+        raindrop_id = doc.raindrop_id
+        if not raindrop_id.isdigit():
+            return
+        stat = (self.notes_dir / filename).stat()
+        with self.lock:
+            self.pending[int(raindrop_id)] = (filename, stat.st_mtime, stat.st_size, note_fields(doc))
+            full = len(self.pending) >= FLUSH_EVERY
+        if full:
+            self.save()
+
+    def rename(self, old_filename: str, new_filename: str):
+        with self.lock:
+            for raindrop_id, (filename, mtime, size, fields) in self.pending.items():
+                if filename == old_filename:
+                    self.pending[raindrop_id] = (new_filename, mtime, size, fields)
+            self.conn.execute("UPDATE notes SET path = ? WHERE path = ?", (new_filename, old_filename))
+
+    def save(self):
+        """
+        在一个事务中写入登记的更新
+        """
+        with self.lock:
+            rows, self.pending = self.pending, {}
+            if not rows:
+                return
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                for raindrop_id, (filename, mtime, size, fields) in rows.items():
+                    self._delete(raindrop_id)
+                    self.conn.execute("""
+                        INSERT INTO notes (id, path, title, domain, created, mtime, size) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (raindrop_id, filename, fields['title'], fields['domain'], fields['created'], mtime, size))
+                    self.conn.executemany("INSERT OR IGNORE INTO note_tags (tag, id) VALUES (?, ?)",
+                                          [(tag.lower(), raindrop_id) for tag in fields['tags']])
+                    self.conn.execute("""
+                        INSERT INTO notes_fts (rowid, title, tags, folder, domain, highlights, summary, body)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (raindrop_id, segment(fields['title']), segment(' '.join(fields['tags'])),
+                          segment(fields['folder']), fields['domain'], segment(fields['highlights']),
+                          segment(fields['summary']), segment(fields['body'])))
+                self.conn.execute('COMMIT')
+            except sqlite3.Error:
+                self.conn.execute('ROLLBACK')
+                raise
+        metrics.inc('search_index_updates_total', len(rows))
+
+    def _delete(self, raindrop_id: int):
+        self.conn.execute("DELETE FROM notes WHERE id = ?", (raindrop_id,))
+        self.conn.execute("DELETE FROM note_tags WHERE id = ?", (raindrop_id,))
+        self.conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (raindrop_id,))
+
+    def refresh(self) -> tuple:
+        """
+        对比目录中笔记的 mtime / size，只重新索引变化的笔记，删除已不存在的笔记，返回 (更新数, 删除数)
+        """
+        with self.lock:
+            indexed = {path: (mtime, size) for path, mtime, size
+                       in self.conn.execute("SELECT path, mtime, size FROM notes")}
+        updated = 0
+        for file_path in self.notes_dir.glob('*.md'):
+            stat = file_path.stat()
+            if indexed.pop(file_path.name, None) == (stat.st_mtime, stat.st_size):
+                continue
+            try:
+                self.update(file_path.name, NoteDocument.from_file(file_path))
+                updated += 1
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"   ⚠️ 读取文件失败 ({file_path.name}): {e}")
+        self.save()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            for path in indexed:
+                for (raindrop_id,) in self.conn.execute("SELECT id FROM notes WHERE path = ?", (path,)).fetchall():
+                    self._delete(raindrop_id)
+            self.conn.execute('COMMIT')
+        return updated, len(indexed)
+
+    def search(self, query: str = '', tags: list = (), domain: str = '', since: str = '', until: str = '',
+               limit: int = 20) -> list:
+        """
+        搜索笔记，返回 [{'id', 'path', 'title', 'domain', 'created', 'snippet'}]
+        有查询词时按相关度排序，否则按创建日期倒序；tags 需全部命中（不区分大小写），
+        domain 同时匹配子域名，since / until 为日期前缀（如 2024 或 2024-03-01），两端都包含
+        """
+        conditions, params = [], []
+        for tag in tags:
+            conditions.append("n.id IN (SELECT id FROM note_tags WHERE tag = ?)")
+            params.append(tag.lower())
+        if domain:
+            domain = domain.lower().removeprefix('www.')
+            conditions.append("(n.domain = ? OR n.domain LIKE ?)")
+            params.extend([domain, f'%.{domain}'])
+        if since:
+            conditions.append("n.created >= ?")
+            params.append(since)
+        if until:
+            conditions.append("substr(n.created, 1, ?) <= ?")
+            params.extend([len(until), until])
+
+        match = build_query(query)
+        if match:
+            sql = f"""
+                SELECT n.id, n.path, n.title, n.domain, n.created
+                FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid
+                WHERE notes_fts MATCH ? {''.join(f' AND {condition}' for condition in conditions)}
+                ORDER BY bm25(notes_fts, {', '.join(map(str, COLUMN_WEIGHTS))}) LIMIT ?
+            """
+            params = [match] + params
+        else:
+            sql = f"""
+                SELECT n.id, n.path, n.title, n.domain, n.created
+                FROM notes n {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                ORDER BY n.created DESC, n.id DESC LIMIT ?
+            """
+        with self.lock:
+            rows = self.conn.execute(sql, params + [limit]).fetchall()
+        terms = [term for term in (word.rstrip('*').replace('"', '') for word in query.split()) if term]
+        return [{'id': raindrop_id, 'path': path, 'title': title, 'domain': domain, 'created': created,
+                 'snippet': self.snippet(path, terms) if terms else ''}
+                for raindrop_id, path, title, domain, created in rows]
+
+    def snippet(self, filename: str, terms: list) -> str:
+        """
+        从笔记原文截取摘录（索引中是切分后的文本，只读取返回的这几篇笔记）
+        """
+        try:
+            fields = note_fields(NoteDocument.from_file(self.notes_dir / filename))
+        except (OSError, UnicodeDecodeError):
+            return ''
+        return make_snippet('\n'.join([fields['highlights'], fields['summary'], fields['body']]), terms)
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    """
+    主函数
+    """
+    output_dir = os.getenv('OUTPUT_DIR', '30_Resources')
+
+    parser = argparse.ArgumentParser(description='搜索 Raindrop 笔记')
+    parser.add_argument('query', nargs='*', help='查询词（空格分隔的词都要出现，英文词以 * 结尾为前缀匹配）')
+    parser.add_argument('--tag', action='append', default=[], help='只看带有该标签的笔记（可重复）')
+    parser.add_argument('--domain', default='', help='只看该域名（含子域名）的笔记')
+    parser.add_argument('--since', default='', help='创建日期不早于（如 2024 或 2024-03-01）')
+    parser.add_argument('--until', default='', help='创建日期不晚于（如 2024-06 或 2024-06-30）')
+    parser.add_argument('--limit', type=int, default=20, help='最多返回的结果数')
+    parser.add_argument('--refresh', action='store_true', help='先重新索引有变化的笔记（如 git pull 之后）')
+    args = parser.parse_args()
+
+    notes_dir = Path(output_dir) / 'Raindrop'
+    index = SearchIndex.open(notes_dir)
+    if index is None or args.refresh:
+        if index is None:
+            print(f"🔨 正在建立搜索索引: {notes_dir}")
+            index = SearchIndex(notes_dir)
+        started = time.perf_counter()
+        updated, removed = index.refresh()
+        print(f"🔄 索引 {index.count()} 个笔记: 更新 {updated} 个, 删除 {removed} 个 "
+              f"({time.perf_counter() - started:.1f}s)")
+
+    if args.query or args.tag or args.domain or args.since or args.until:
+        started = time.perf_counter()
+        try:
+            results = index.search(' '.join(args.query), args.tag, args.domain, args.since, args.until, args.limit)
+        except sqlite3.OperationalError as e:
+            print(f"❌ 查询失败: {e}")
+            return
+        print(f"🔎 {len(results)} 个结果 ({(time.perf_counter() - started) * 1000:.1f}ms)\n")
+        for result in results:
+            print(f"📄 {result['created']}  {result['title']}  ({result['domain']})")
+            print(f"   {result['path']}")
+            if result['snippet']:
+                print(f"   {result['snippet']}")
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
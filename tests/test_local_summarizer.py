@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+本地抽取式摘要测试
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import local_summarizer
+from local_tagger import tokenize
+from note_document import NoteDocument
+
+EXCERPT = [
+    'Rust 的所有权系统在编译期保证内存安全，无需垃圾回收。',
+    '所有权系统让 Rust 在编译期发现内存安全问题。',
+    '借用检查器是 Rust 编译期内存安全的核心。',
+    'Rust 的编译期检查让并发代码也更安全。',
+]
+HIGHLIGHT = '我最喜欢的是 cargo 的依赖管理体验非常顺手。'
+
+
+def test_isolated_highlight_ranks_first():
+    # 高亮与摘要中的句子没有公共词，只能靠初始权重胜出
+    sentences = EXCERPT + [HIGHLIGHT]
+    token_sets = [set(tokenize(sentence)) for sentence in sentences]
+    assert not any(token_sets[-1] & tokens for tokens in token_sets[:-1])
+
+    scores = local_summarizer.textrank(token_sets, [1.0] * len(EXCERPT) + [2.0])
+    assert max(range(len(scores)), key=scores.__getitem__) == len(EXCERPT)
+    assert abs(sum(scores) - 1) < 1e-6
+
+
+def test_summary_keeps_isolated_highlight():
+    excerpt = ''.join(EXCERPT)
+    doc = NoteDocument.parse(f"# Rust\n\n## 📝 摘要\n\n{excerpt}\n\n## ✨ 高亮标注\n\n> {HIGHLIGHT}\n\n")
+    summary = local_summarizer.summarize(doc)
+    assert f'- {HIGHLIGHT}' in summary.splitlines()
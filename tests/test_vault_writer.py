@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+VaultWriter 端到端测试
+在本地裸仓库上走一遍工作流用到的路径：浅克隆 + 稀疏检出、只暂存改动路径的提交（含重命名）、推送，
+再检查远端的文件树。
+
+用法:
+    python -m pytest tests/
+"""
+
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vault_writer import VaultWriter
+
+RAINDROP_DIR = '30_Resources/Raindrop'
+IDENTITY = ['-c', 'user.name=Test', '-c', 'user.email=test@example.com']
+
+
+def git(*args, cwd: Path = None) -> str:
+    return subprocess.run(['git', *IDENTITY, *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+
+def remote_files(remote: Path) -> set:
+    return set(git('--git-dir', str(remote), 'ls-tree', '-r', '--name-only', 'main').split())
+
+
+def remote_text(remote: Path, path: str) -> str:
+    return git('--git-dir', str(remote), 'show', f'main:{path}')
+
+
+@pytest.fixture
+def remote(tmp_path: Path) -> Path:
+    """
+    裸仓库 remote.git：Raindrop 目录下两篇笔记和同步状态，另有一个不在稀疏检出范围内的目录
+    """
+    remote = tmp_path / 'remote.git'
+    git('init', '-q', '--bare', '-b', 'main', str(remote))
+    seed = tmp_path / 'seed'
+    git('init', '-q', '-b', 'main', str(seed))
+    files = {
+        f'{RAINDROP_DIR}/keep.md': '# Keep\n',
+        f'{RAINDROP_DIR}/old-title.md': '# Old title\n',
+        f'{RAINDROP_DIR}/.sync/cursor.json': '{}\n',
+        'Journal/2026-01-01.md': '# Journal\n',
+    }
+    for path, content in files.items():
+        (seed / path).parent.mkdir(parents=True, exist_ok=True)
+        (seed / path).write_text(content, encoding='utf-8')
+    # 旧版本曾提交过的 SQLite 状态
+    sqlite3.connect(str(seed / RAINDROP_DIR / '.sync' / 'ai_jobs.sqlite')).close()
+    git('add', '-A', cwd=seed)
+    git('commit', '-q', '-m', 'seed', cwd=seed)
+    git('push', '-q', str(remote), 'main', cwd=seed)
+    return remote
+
+
+def clone(remote: Path, tmp_path: Path) -> VaultWriter:
+    writer = VaultWriter.clone(remote.as_uri(), tmp_path / 'vault', branch='main', sparse_paths=[RAINDROP_DIR])
+    git('config', 'user.name', 'Test', cwd=writer.repo_dir)
+    git('config', 'user.email', 'test@example.com', cwd=writer.repo_dir)
+    return writer
+
+
+def test_sparse_clone_checks_out_only_raindrop(remote: Path, tmp_path: Path):
+    writer = clone(remote, tmp_path)
+    assert (writer.repo_dir / RAINDROP_DIR / 'keep.md').exists()
+    assert not (writer.repo_dir / 'Journal').exists()
+    # 浅克隆只有一个提交
+    assert git('rev-list', '--count', 'HEAD', cwd=writer.repo_dir).strip() == '1'
+
+
+def test_commit_rename_and_push(remote: Path, tmp_path: Path):
+    writer = clone(remote, tmp_path)
+    notes = writer.repo_dir / RAINDROP_DIR
+    (notes / 'keep.md').write_text('# Keep\n\n更新\n', encoding='utf-8')
+    (notes / 'old-title.md').rename(notes / 'new-title.md')
+    (notes / 'created.md').write_text('# Created\n', encoding='utf-8')
+    # 没有记录的改动不应被提交
+    (notes / 'scratch.md').write_text('# Scratch\n', encoding='utf-8')
+
+    writer.touch(notes / 'keep.md', notes / 'old-title.md', notes / 'new-title.md', notes / 'created.md')
+    assert writer.commit('sync: test')
+    writer.push(branch='main')
+
+    files = remote_files(remote)
+    assert f'{RAINDROP_DIR}/new-title.md' in files
+    assert f'{RAINDROP_DIR}/old-title.md' not in files
+    assert f'{RAINDROP_DIR}/created.md' in files
+    assert f'{RAINDROP_DIR}/scratch.md' not in files
+    # 稀疏检出范围外的文件保留在远端
+    assert 'Journal/2026-01-01.md' in files
+    assert remote_text(remote, f'{RAINDROP_DIR}/keep.md') == '# Keep\n\n更新\n'
+    assert remote_text(remote, f'{RAINDROP_DIR}/new-title.md') == '# Old title\n'
+    assert git('--git-dir', str(remote), 'log', '-1', '--format=%s', 'main').strip() == 'sync: test'
+
+
+def test_untrack_removes_local_state_but_keeps_file(remote: Path, tmp_path: Path):
+    writer = clone(remote, tmp_path)
+    state = writer.repo_dir / RAINDROP_DIR / '.sync'
+    (state / 'cursor.json').write_text('{"last_id": 1}\n', encoding='utf-8')
+
+    writer.touch(state / 'cursor.json')
+    writer.untrack(state / '*.sqlite*')
+    assert writer.commit('sync: state')
+    writer.push(branch='main')
+
+    files = remote_files(remote)
+    assert f'{RAINDROP_DIR}/.sync/ai_jobs.sqlite' not in files
+    assert remote_text(remote, f'{RAINDROP_DIR}/.sync/cursor.json') == '{"last_id": 1}\n'
+    assert (state / 'ai_jobs.sqlite').exists()
+
+
+def test_sync_from_another_cwd_with_relative_output_dir(remote: Path, tmp_path: Path, monkeypatch):
+    """
+    OUTPUT_DIR 为相对路径（默认 30_Resources）且不在 vault 根目录运行时，改动路径按当前工作目录解析
+    """
+    from raindrop_api_sync import RaindropSync
+    from raindrop_pipeline import commit_vault
+
+    writer = clone(remote, tmp_path)
+    monkeypatch.chdir(tmp_path)
+    syncer = RaindropSync('token', 'vault/30_Resources', sync_highlights=False)
+    syncer.sync(3, [{
+        '_id': 1, 'title': 'Relative', 'link': 'https://example.com/relative', 'excerpt': '', 'tags': [],
+        'created': '2026-10-01T00:00:00Z', 'lastUpdate': '2026-10-01T00:00:00Z', 'collection': {'$id': -1},
+        'domain': 'example.com'
+    }])
+    commit_vault(syncer, syncer.touched_paths | syncer.state_paths(), push=True)
+
+    files = remote_files(remote)
+    assert f'{RAINDROP_DIR}/2026-10-01-Relative.md' in files
+    assert f'{RAINDROP_DIR}/.sync/cursor.json' in files
+    assert f'{RAINDROP_DIR}/.sync/ai_jobs.sqlite' not in files
+    assert (writer.repo_dir / RAINDROP_DIR / '.sync' / 'ai_jobs.sqlite').exists()
+
+
+def test_commit_without_changes_is_skipped(remote: Path, tmp_path: Path):
+    writer = clone(remote, tmp_path)
+    head = git('rev-parse', 'HEAD', cwd=writer.repo_dir)
+    assert not writer.commit('sync: nothing')
+    writer.touch(writer.repo_dir / RAINDROP_DIR / 'keep.md')
+    assert not writer.commit('sync: unchanged')
+    assert git('rev-parse', 'HEAD', cwd=writer.repo_dir) == head
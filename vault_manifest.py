@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Vault 笔记清单
+记录 Raindrop 目录下每个笔记的 mtime / size / raindrop_id / url / 创建日期 / 是否收藏 / 是否已有 AI 总结，
+由同步和 AI 步骤在写文件时维护，挑选待处理笔记时无需扫描和读取整个目录。
+"""
+
+import json
+import threading
+from pathlib import Path
+
+from note_document import NoteDocument
+
+
+class VaultManifest:
+    """
+    文件名 -> 笔记元数据 的清单（保存在 .sync/manifest.json）
+    """
+    VERSION = 1
+
+    def __init__(self, notes_dir: Path, manifest_path: Path):
+        self.notes_dir = Path(notes_dir)
+        self.manifest_path = Path(manifest_path)
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        读取清单，不存在或损坏时扫描目录重建
+        """
+        if self.manifest_path.exists():
+            try:
+                data = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+                if data.get('version') == self.VERSION:
+                    self.entries = data.get('notes', {})
+                    return
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ 读取笔记清单失败，将重建: {e}")
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        扫描目录重建清单（只在清单丢失时执行一次）
+        """
+        print(f"🔨 正在重建笔记清单: {self.notes_dir}")
+        self.entries = {}
+        for file_path in self.notes_dir.glob('*.md'):
+            try:
+                self.record(file_path.name, NoteDocument.from_file(file_path))
+            except Exception as e:
+                print(f"   ⚠️ 读取文件失败 ({file_path.name}): {e}")
+        self.dirty = True
+        print(f"   清单包含 {len(self.entries)} 个笔记")
+
+    def record(self, filename: str, doc: NoteDocument):
+        """
+        笔记写入后更新清单项
+        """
+        stat = (self.notes_dir / filename).stat()
+        with self.lock:
+            self.entries[filename] = {
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'raindrop_id': doc.raindrop_id,
+                'url': doc.url,
+                'created': doc.get('created'),
+                'favorite': doc.get('favorite') == 'true',
+                'has_summary': doc.has_summary,
+                'provisional': doc.provisional
+            }
+            self.dirty = True
+
+    def rename(self, old_filename: str, new_filename: str):
+        with self.lock:
+            entry = self.entries.pop(old_filename, None)
+            if entry is not None:
+                self.entries[new_filename] = entry
+                self.dirty = True
+
+    def remove(self, filename: str):
+        with self.lock:
+            if self.entries.pop(filename, None) is not None:
+                self.dirty = True
+
+    def pending(self) -> list:
+        """
+        有 URL 但还没有 AI 总结（或只有本地临时摘要）的笔记文件名（按文件名倒序，即最新的在前）
+        """
+        with self.lock:
+            return sorted((filename for filename, entry in self.entries.items()
+                           if entry.get('url') and not entry.get('has_summary')), reverse=True)
+
+    def save(self):
+        """
+        原子写入清单（无变化时不写）
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            data = {'version': self.VERSION, 'notes': self.entries}
+            tmp_path = self.manifest_path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True), encoding='utf-8')
+            tmp_path.replace(self.manifest_path)
+            self.dirty = False
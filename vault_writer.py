@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Vault Git 写入器
+只暂存同步 / AI 步骤实际改动过的路径（不再对整个工作区执行 git add .），每次运行生成一个提交。
+支持只检出 Raindrop 目录的浅克隆 + 稀疏检出，提交耗时不随 vault 规模增长。
+"""
+
+import argparse
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+
+class VaultWriterError(Exception):
+    """
+    git 命令执行失败
+    """
+
+
+class VaultWriter:
+    """
+    记录改动路径并生成单个提交
+    """
+    def __init__(self, repo_dir: Path):
+        self.repo_dir = Path(repo_dir).resolve()
+        self.paths = set()
+        # 从仓库中移除但保留在工作区的路径（可以是通配符）
+        self.untracked = set()
+
+    @classmethod
+    def for_path(cls, path: Path) -> 'VaultWriter':
+        """
+        根据 vault 内任意路径定位仓库根目录
+        """
+        top = subprocess.run(['git', '-C', str(path), 'rev-parse', '--show-toplevel'],
+                             capture_output=True, text=True)
+        if top.returncode != 0:
+            raise VaultWriterError(f"{path} 不在 git 仓库中: {top.stderr.strip()}")
+        return cls(Path(top.stdout.strip()))
+
+    @staticmethod
+    def clone(remote: str, dest: Path, branch: str = None, sparse_paths: list = None,
+              depth: int = 1) -> 'VaultWriter':
+        """
+        浅克隆 vault；指定 sparse_paths 时只检出这些目录
+        """
+        command = ['git', 'clone', '--depth', str(depth), '--filter=blob:none']
+        if branch:
+            command += ['--branch', branch]
+        if sparse_paths:
+            command.append('--sparse')
+        command += [remote, str(dest)]
+        run_git(command)
+
+        writer = VaultWriter(dest)
+        if sparse_paths:
+            writer.git('sparse-checkout', 'set', *sparse_paths)
+        return writer
+
+    def git(self, *args, input_text: str = None) -> str:
+        return run_git(['git', '-C', str(self.repo_dir), '-c', 'core.quotepath=off', *args], input_text)
+
+    def touch(self, *paths):
+        """
+        记录改动过（新建 / 修改 / 删除 / 重命名前后）的路径，相对路径按当前工作目录解析
+        （与同步器写文件时的口径一致，如默认的 OUTPUT_DIR=30_Resources）
+        """
+        for path in paths:
+            path = Path(path).absolute()
+            self.paths.add(path.resolve() if path.exists() else path.parent.resolve() / path.name)
+
+    def untrack(self, *paths):
+        """
+        记录不再提交的路径：已提交过的从仓库中移除，工作区中的文件保留（相对路径按当前工作目录解析）
+        """
+        for path in paths:
+            path = Path(path).absolute()
+            self.untracked.add(path.parent.resolve() / path.name)
+
+    def relative_paths(self, paths: set = None) -> list:
+        relative = []
+        for path in sorted(self.paths if paths is None else paths):
+            try:
+                relative.append(path.relative_to(self.repo_dir).as_posix())
+            except ValueError:
+                print(f"⚠️ 路径不在 vault 仓库中，忽略: {path}")
+        return relative
+
+    def commit(self, message: str) -> bool:
+        """
+        只暂存记录的路径并提交，没有实际变更时返回 False
+        """
+        relative = self.relative_paths()
+        if not relative:
+            print("📭 没有需要提交的路径")
+            return False
+        untracked = self.relative_paths(self.untracked)
+
+        # 路径通过 stdin 传入，避免命令行过长
+        existing = [path for path in relative if (self.repo_dir / path).exists()]
+        missing = [path for path in relative if not (self.repo_dir / path).exists()]
+        if existing:
+            self.git('add', '-A', '--pathspec-from-file=-', input_text='\n'.join(existing) + '\n')
+        if missing:
+            # 已删除的文件（如重命名前的旧文件）
+            self.git('rm', '-q', '--cached', '--ignore-unmatch', '--pathspec-from-file=-',
+                     input_text='\n'.join(missing) + '\n')
+        if untracked:
+            self.git('rm', '-r', '-q', '--cached', '--ignore-unmatch', '--pathspec-from-file=-',
+                     input_text='\n'.join(untracked) + '\n')
+        staged = subprocess.run(['git', '-C', str(self.repo_dir), 'diff', '--cached', '--quiet'])
+        if staged.returncode == 0:
+            print("📭 没有实际变更，跳过提交")
+            self.paths.clear()
+            self.untracked.clear()
+            return False
+
+        self.git('commit', '-q', '-m', message)
+        print(f"📦 已提交 {len(relative)} 个路径: {message}")
+        self.paths.clear()
+        self.untracked.clear()
+        return True
+
+    def push(self, remote: str = 'origin', branch: str = 'main'):
+        self.git('push', remote, f'HEAD:{branch}')
+        print(f"🚀 已推送到 {remote}/{branch}")
+
+
+def run_git(command: list, input_text: str = None) -> str:
+    result = subprocess.run(command, capture_output=True, text=True, input=input_text)
+    if result.returncode != 0:
+        raise VaultWriterError(f"{' '.join(command[:4])} ... 失败: {result.stderr.strip()}")
+    return result.stdout
+
+
+def default_message() -> str:
+    return f"sync: Raindrop bookmarks {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+def main():
+    """
+    命令行：克隆 vault（浅克隆 + 稀疏检出）
+    """
+    parser = argparse.ArgumentParser(description='Vault 仓库工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    clone_parser = subparsers.add_parser('clone', help='浅克隆 vault，只检出指定目录')
+    clone_parser.add_argument('remote')
+    clone_parser.add_argument('dest')
+    clone_parser.add_argument('--branch')
+    clone_parser.add_argument('--sparse', action='append', default=[], help='只检出的目录（可重复）')
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'clone':
+            VaultWriter.clone(args.remote, Path(args.dest), args.branch, args.sparse)
+            print(f"✅ 已克隆到 {args.dest}")
+    except VaultWriterError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()